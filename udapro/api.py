@@ -0,0 +1,228 @@
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+
+from cache import cache, cache_key
+from models import db, Venue, Artist, Show
+from queries import format_cursor, keyset_query, upcoming_shows_count, venue_detail, artist_detail
+from replicas import pinned_to_primary, reading_from_replica, replica_reads
+from search import search
+
+#----------------------------------------------------------------------------#
+# JSON read API, version 1.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+# bytes gathered before a chunk of a streamed list is sent
+CHUNK_SIZE = 64 * 1024
+
+
+def venue_fields(now):
+    return OrderedDict([
+        ('id', Venue.id),
+        ('name', Venue.name),
+        ('city', Venue.city),
+        ('state', Venue.state),
+        ('address', Venue.address),
+        ('phone', Venue.phone),
+        ('genres', Venue.genres),
+        ('image_link', Venue.image_link),
+        ('facebook_link', Venue.facebook_link),
+        ('website_link', Venue.website_link),
+        ('seeking_talent', Venue.seeking_talent),
+        ('seeking_description', Venue.seeking_description),
+        ('num_upcoming_shows', upcoming_shows_count(Show.venue_id, Venue.id, now)),
+    ])
+
+
+def artist_fields(now):
+    return OrderedDict([
+        ('id', Artist.id),
+        ('name', Artist.name),
+        ('city', Artist.city),
+        ('state', Artist.state),
+        ('phone', Artist.phone),
+        ('genres', Artist.genres),
+        ('image_link', Artist.image_link),
+        ('facebook_link', Artist.facebook_link),
+        ('website_link', Artist.website_link),
+        ('seeking_venue', Artist.seeking_venue),
+        ('seeking_description', Artist.seeking_description),
+        ('num_upcoming_shows', upcoming_shows_count(Show.artist_id, Artist.id, now)),
+    ])
+
+
+def show_fields():
+    return OrderedDict([
+        ('id', Show.id),
+        ('start_time', Show.start_time),
+        ('end_time', Show.end_time),
+        ('venue_id', Show.venue_id),
+        ('venue_name', Venue.name),
+        ('artist_id', Show.artist_id),
+        ('artist_name', Artist.name),
+        ('artist_image_link', Artist.image_link),
+    ])
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def selected_fields(available):
+    # ?fields=id,name selects columns; unknown names are a client error
+    names = request.args.get('fields')
+    if not names:
+        return list(available)
+
+    fields = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        abort(400, 'Unknown fields: ' + ', '.join(unknown))
+    return fields
+
+
+def stream_list(query, columns, fields):
+    # keyset page streamed as it is read from a server-side cursor; rows
+    # lead with the sort key, and the next cursor is only known once the
+    # page has been read, so it closes the document
+    after = request.args.get('after')
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+    rows = keyset_query(query, columns, after) \
+        .limit(limit + 1) \
+        .execution_options(stream_results=True) \
+        .yield_per(1000)
+
+    def generate():
+        buffer = ['{"data": [']
+        size = 0
+        count = 0
+        last_key = None
+        next_cursor = None
+
+        for row in rows:
+            if count == limit:
+                next_cursor = format_cursor(last_key)
+                break
+            item = json.dumps(dict(zip(fields, row[len(columns):])), default=to_json)
+            buffer.append(item if not count else ',' + item)
+            size += len(item)
+            count += 1
+            last_key = row[:len(columns)]
+
+            if size >= CHUNK_SIZE:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+
+        buffer.append('], "next": %s}' % json.dumps(next_cursor))
+        yield ''.join(buffer)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def list_response(available, base_query, columns):
+    fields = selected_fields(available)
+    # the sort key always leads the row, for the cursor, even if not requested
+    query = base_query.with_entities(*columns + [available[name] for name in fields])
+    return stream_list(query, columns, fields)
+
+
+def detail_response(entity, available, extra):
+    if entity is None:
+        abort(404)
+    fields = selected_fields(list(available) + extra)
+    # show start times are datetimes, written as ISO 8601 like the lists
+    body = json.dumps({name: getattr(entity, name) for name in fields}, default=to_json)
+    return Response(body, mimetype='application/json')
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return jsonify(error=error.description), error.code
+
+
+DETAIL_EXTRA = ['upcoming_shows', 'upcoming_shows_count', 'past_shows', 'past_shows_count']
+
+
+@api.route('/venues')
+@replica_reads
+def venues():
+    fields = venue_fields(datetime.now())
+    return list_response(fields, db.session.query(Venue), [Venue.id])
+
+
+@api.route('/venues/<int:venue_id>')
+@replica_reads
+def venue(venue_id):
+    now = datetime.now()
+    fields = venue_fields(now)
+    fields.pop('num_upcoming_shows')
+    return detail_response(venue_detail(venue_id, now), fields, DETAIL_EXTRA)
+
+
+@api.route('/artists')
+@replica_reads
+def artists():
+    fields = artist_fields(datetime.now())
+    return list_response(fields, db.session.query(Artist), [Artist.id])
+
+
+@api.route('/artists/<int:artist_id>')
+@replica_reads
+def artist(artist_id):
+    now = datetime.now()
+    fields = artist_fields(now)
+    fields.pop('num_upcoming_shows')
+    return detail_response(artist_detail(artist_id, now), fields, DETAIL_EXTRA)
+
+
+@api.route('/shows')
+@replica_reads
+def shows():
+    query = db.session.query(Show) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id)
+    return list_response(show_fields(), query, [Show.start_time, Show.id])
+
+
+@api.route('/search/<kind>')
+@replica_reads
+def search_entities(kind):
+    models = {'venues': Venue, 'artists': Artist}
+    if kind not in models:
+        abort(404)
+
+    def build():
+        return search(
+            models[kind],
+            request.args.get('q', ''),
+            datetime.now(),
+            limit=current_app.config['SEARCH_PAGE_SIZE'],
+            offset=max(request.args.get('offset', 0, type=int), 0)
+        )
+
+    # cached like the app's listings; see app.cached
+    if pinned_to_primary():
+        return jsonify(build())
+    results = cache.get_or_set(
+        cache_key(request.endpoint + '/' + kind, request.args),
+        build,
+        tags=(kind, 'shows'),
+        settle=current_app.config['REPLICA_STICKY_SECONDS'] if reading_from_replica() else None
+    )
+    return jsonify(results)
@@ -4,16 +4,36 @@
 
 import json
 import sys
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort 
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, session, make_response, stream_with_context
 from flask_moment import Moment
 import logging
 from flask_migrate import Migrate
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
-from models import db, Artist, Venue, Show
+from models import db, Artist, ArtistAvailability, Venue, Show
+from queries import (
+  venue_areas, venue_validator, venue_detail,
+  artist_page, artist_validator, artist_detail, artist_windows,
+  show_page
+)
+from filters import format_datetime
+from templating import init_templates
+from pooling import init_pool
+from instrumentation import init_instrumentation
+from replicas import init_replicas, pinned_to_primary, reading_from_replica, replica_reads
+from search import search
+from suggest import suggest_index
+from recent import recent_listings
+from cache import cache, cache_key
+from api import api
+from export import FORMATS, export_chunks, export_shows_command
+from booking import artist_available, book_shows, is_double_booking, parse_entry
+from importer import import_command
+from datagen import generate_command
+from rollup import refresh_venue_areas_command
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -24,6 +44,18 @@ db.init_app(app)
 # connecting to a local postgresql database
 app.config.from_object('config')
 migrate = Migrate(app, db)
+init_pool(app)
+init_replicas(app)
+init_instrumentation(app)
+cache.init_app(app)
+init_templates(app)
+recent_listings.init_app(app)
+suggest_index.init_app(app)
+app.register_blueprint(api)
+app.cli.add_command(export_shows_command)
+app.cli.add_command(import_command)
+app.cli.add_command(generate_command)
+app.cli.add_command(refresh_venue_areas_command)
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -36,18 +68,56 @@ migrate = Migrate(app, db)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
 app.jinja_env.filters['datetime'] = format_datetime
 
 
 
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def page_args(default=None):
+  # keyset cursor and page size for the listing pages
+    limit = request.args.get('limit', default or app.config['PAGE_SIZE'], type=int)
+
+    return {
+        'after': request.args.get('after'),
+        'before': request.args.get('before'),
+        'limit': max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+    }
+
+
+def cached(tags, builder):
+  # listing and search data, keyed by endpoint and request arguments and
+  # dropped once a commit touches one of the tagged tables. A client that
+  # has just written reads past the cache, from the primary; a listing
+  # built from a replica within REPLICA_STICKY_SECONDS of its tables
+  # changing may lack the change, so it is not stored
+    if pinned_to_primary():
+        return builder()
+    key = cache_key(request.endpoint, request.values)
+    settle = app.config['REPLICA_STICKY_SECONDS'] if reading_from_replica() else None
+    return cache.get_or_set(key, builder, tags=tags, settle=settle)
+
+
+def not_modified(etag):
+    # pages are validated by ETag alone; If-Modified-Since is ignored
+    return request.if_none_match.contains(etag)
+
+
+def conditional(body, etag, flashed=False):
+    response = make_response(body)
+    # a page carrying flashed messages must never be replayed
+    if flashed:
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    # clients and proxies may keep the page but must revalidate it
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -61,76 +131,31 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@replica_reads
 def venues():
   # replacing with real venues data.
- 
-    data_areas = []
-
-    areas = Venue.query \
-        .with_entities(Venue.city, Venue.state) \
-        .group_by(Venue.city, Venue.state) \
-        .all()
+    # pages are of city/state areas, each listing all its venues
+    args = page_args(app.config['AREA_PAGE_SIZE'])
+    page = cached(('venues', 'shows'), lambda: venue_areas(datetime.now(), **args))
 
-    for area in areas:
-        data_venues = []
-
-        venues = Venue.query \
-            .filter_by(state=area.state) \
-            .filter_by(city=area.city) \
-            .all()
-
-        for venue in venues:
-            upcoming_shows = db.session \
-                    .query(Show) \
-                    .filter(Show.venue_id == venue.id) \
-                    .filter(Show.start_time > datetime.now()) \
-                    .all()
-
-            data_venues.append({
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': len(upcoming_shows)
-            })
-
-        data_areas.append({
-            'city': area.city,
-            'state': area.state,
-            'venues': data_venues
-        })
-
-    return render_template('pages/venues.html', areas=data_areas)
+    return render_template('pages/venues.html', areas=page.items, page=page)
 
 
 @app.route('/venues/search', methods=['POST'])
+@replica_reads
 def search_venues():
   # implementing search on artists with partial string search. 
 
     search_term = request.form['search_term']
-    search = "%{}%".format(search_term)
-
-    venues = Venue.query \
-        .with_entities(Venue.id, Venue.name) \
-        .filter(Venue.name.match(search)) \
-        .all()
-
-    data_venues = []
-    for venue in venues:
-        upcoming_shows = db.session \
-                .query(Show) \
-                .filter(Show.venue_id == venue.id) \
-                .filter(Show.start_time > datetime.now()) \
-                .all()
-
-        data_venues.append({
-            'id': venue.id,
-            'name': venue.name,
-            'num_upcoming_shows': len(upcoming_shows)
-        })
-
-    results = {
-        'venues': data_venues,
-        'count': len(venues)
-    }
+    offset = request.form.get('offset', 0, type=int)
+
+    results = cached(('venues', 'shows'), lambda: search(
+      Venue,
+      search_term,
+      datetime.now(),
+      limit=app.config['SEARCH_PAGE_SIZE'],
+      offset=max(offset, 0)
+    ))
 
     return render_template(
       'pages/search_venues.html',
@@ -139,59 +164,39 @@ def search_venues():
     )
 
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # showing the venue page with the given venue_id
-  # getting real venue data from the venues table, using venue_id
-    data_venue = Venue.query.filter(Venue.id == venue_id).first()
-
-    upcoming_shows = Show.query \
-        .filter(Show.venue_id == venue_id) \
-        .filter(Show.start_time > datetime.now()) \
-        .all()
-
-    if len(upcoming_shows) > 0:
-        data_upcoming_shows = []
-
-        for upcoming_show in upcoming_shows:
-            artist = Artist.query \
-                .filter(Artist.id == upcoming_show.artist_id) \
-                .first()
-
-            data_upcoming_shows.append({
-                'artist_id': artist.id,
-                'artist_name': artist.name,
-                'artist_image_link': artist.image_link,
-                'start_time': str(upcoming_show.start_time),
-            })
-
-        data_venue.upcoming_shows = data_upcoming_shows
-        data_venue.upcoming_shows_count = len(data_upcoming_shows)
+@app.route('/search/suggest')
+def search_suggest():
+  # typeahead for the navbar search box, served from memory
+    search_term = request.args.get('q', '')
+    kind = request.args.get('type', 'venues')
+    if kind not in ('venues', 'artists'):
+        abort(400)
 
-    past_shows = Show.query \
-        .filter(Show.venue_id == venue_id) \
-        .filter(Show.start_time < datetime.now()) \
-        .all()
+    suggestions = suggest_index.suggest(
+      search_term,
+      kind,
+      limit=max(1, min(request.args.get('limit', 10, type=int), 25))
+    )
 
-    if len(past_shows) > 0:
-        data_past_shows = []
+    return jsonify(suggestions=suggestions)
 
-        for past_show in past_shows:
-            artist = Artist.query \
-                .filter(Artist.id == past_show.artist_id) \
-                .first()
 
-            data_past_shows.append({
-                'artist_id': artist.id,
-                'artist_name': artist.name,
-                'artist_image_link': artist.image_link,
-                'start_time': str(past_show.start_time),
-            })
+@app.route('/venues/<int:venue_id>')
+@replica_reads
+def show_venue(venue_id):
+  # showing the venue page with the given venue_id
+  # getting real venue data from the venues table, using venue_id
+    now = datetime.now()
+    etag = venue_validator(venue_id, now)
+    if etag is None:
+        abort(404)
+    flashed = '_flashes' in session
+    if not flashed and not_modified(etag):
+        return Response(status=304, headers={'ETag': '"%s"' % etag})
 
-        data_venue.past_shows = data_past_shows
-        data_venue.past_shows_count = len(data_past_shows)
+    data_venue = venue_detail(venue_id, now)
 
-    return render_template('pages/show_venue.html', venue=data_venue)
+    return conditional(render_template('pages/show_venue.html', venue=data_venue), etag, flashed=flashed)
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -238,6 +243,8 @@ def create_venue_submission():
 
         db.session.add(venue)
         db.session.commit()
+        suggest_index.add('venues', venue.id, name)
+        recent_listings.add('venues', venue)
     except Exception:
         error = True
         db.session.rollback()
@@ -263,6 +270,8 @@ def delete_venue(venue_id):
     try:
         Venue.query.filter_by(id=venue_id).delete()
         db.session.commit()
+        suggest_index.remove('venues', int(venue_id))
+        recent_listings.changed('venues', int(venue_id))
     except Exception as e:
         error = True
         db.session.rollback()
@@ -288,96 +297,47 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@replica_reads
 def artists():
-    data = []
-    # Getting data from the data base
-    artists = Artist.query.with_entities(Artist.id, Artist.name).order_by('id').all()
-    for artist in artists:
-        # for each artists upcoming show
-        upcoming_shows = db.session.query(Show).filter(Show.artist_id == artist.id).filter(Show.start_time > datetime.now()).all()
+    # Getting one page of artists from the data base
+    args = page_args()
+    page = cached(('artists', 'shows'), lambda: artist_page(datetime.now(), **args))
 
-        data.append({
-            'id': artist.id,
-            'name': artist.name,
-            'num_upcoming_shows': len(upcoming_shows)
-        })
-
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=page.items, page=page)
 
 @app.route('/artists/search', methods=['POST'])
+@replica_reads
 def search_artists():
   # searching for artists with partial string search.
     search_term = request.form['search_term']
-    search = "%{}%".format(search_term)
-
-    artists = Artist.query.with_entities(Artist.id, Artist.name).filter(Artist.name.match(search)).all()
+    offset = request.form.get('offset', 0, type=int)
 
-    data = []
-    for artist in artists:
-        #filtering by shows
-        upcoming_shows = db.session.query(Show).filter(Show.artist_id == artist.id).filter(Show.start_time > datetime.now()).all()
-
-        # Grouping the data
-        data.append({
-            'id': artist.id,
-            'name': artist.name,
-            'num_upcoming_shows': len(upcoming_shows)
-        })
-
-    response = {
-        'data': data,
-        'count': len(artists)
-    }
+    response = cached(('artists', 'shows'), lambda: search(
+      Artist,
+      search_term,
+      datetime.now(),
+      limit=app.config['SEARCH_PAGE_SIZE'],
+      offset=max(offset, 0)
+    ))
 
     return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@replica_reads
 def show_artist(artist_id):
   # showing the artist page with the given artist_id
   # Getting data from the artist table, using artist_id
-    data = Artist.query.filter(Artist.id == artist_id).first()
-
-    upcoming_shows = Show.query.filter(Show.artist_id == artist_id).filter(Show.start_time > datetime.now()).all()
-
-    if len(upcoming_shows) > 0:
-        upcoming_shows_queue = []
-
-        # Getting upcoming shows and grouping by venue
-        for upcoming_show in upcoming_shows:
-            venue = Venue.query.filter(Venue.id == upcoming_show.venue_id).first()
-
-            upcoming_shows_queue.append({
-                'venue_id': venue.id,
-                'venue_name': venue.name,
-                'venue_image_link': venue.image_link,
-                'start_time': str(upcoming_show.start_time),
-            })
-
-        # adding data to query
-        data.upcoming_shows = upcoming_shows_queue
-        data.upcoming_shows_count = len(upcoming_shows_queue)
+    now = datetime.now()
+    etag = artist_validator(artist_id, now)
+    if etag is None:
+        abort(404)
+    flashed = '_flashes' in session
+    if not flashed and not_modified(etag):
+        return Response(status=304, headers={'ETag': '"%s"' % etag})
 
-    # Getting past shows and grouping by venue
-    past_shows = Show.query.filter(Show.artist_id == artist_id).filter(Show.start_time < datetime.now()).all()
+    data = artist_detail(artist_id, now)
 
-    if len(past_shows) > 0:
-        data_past_shows = []
-
-        for past_show in past_shows:
-            venue = Venue.query.filter(Venue.id == upcoming_show.venue_id).first()
-
-            data_past_shows.append({
-                'venue_id': venue.id,
-                'venue_name': venue.name,
-                'venue_image_link': venue.image_link,
-                'start_time': str(past_show.start_time),
-            })
-
-        # adding data to query
-        data.past_shows = data_past_shows
-        data.past_shows_count = len(data_past_shows)
-
-    return render_template('pages/show_artist.html', artist=data)
+    return conditional(render_template('pages/show_artist.html', artist=data), etag, flashed=flashed)
 
 #  Update
 #  ----------------------------------------------------------------
@@ -438,6 +398,8 @@ def edit_artist_submission(artist_id):
         artist.image_link = image_link
 
         db.session.commit()
+        suggest_index.add('artists', artist_id, name)
+        recent_listings.changed('artists', artist_id)
     except Exception:
         error = True
         db.session.rollback()
@@ -459,6 +421,78 @@ def edit_artist_submission(artist_id):
 
     return redirect(url_for('show_artist', artist_id=artist_id))
 
+#  Availability
+#  ----------------------------------------------------------------
+@app.route('/artists/<int:artist_id>/availability', methods=['GET'])
+def artist_availability(artist_id, form=None):
+  # the artist's availability windows that have not ended yet; an artist
+  # with none can be booked at any time
+    artist = Artist.query.get_or_404(artist_id)
+    windows = artist_windows(artist_id, datetime.now())
+    return render_template(
+      'pages/artist_availability.html',
+      artist=artist,
+      windows=windows,
+      form=form or AvailabilityForm(),
+      remove_form=RemoveAvailabilityForm()
+    )
+
+@app.route('/artists/<int:artist_id>/availability', methods=['POST'])
+def create_availability_submission(artist_id):
+    form = AvailabilityForm()
+    valid = form.validate_on_submit()
+    if valid and form.ends.data <= form.starts.data:
+        form.ends.errors = ['The window must end after it starts.']
+        valid = False
+    if not valid:
+        return artist_availability(artist_id, form=form), 400
+
+    error = False
+    try:
+        window = ArtistAvailability(
+          artist_id=artist_id,
+          during=func.tstzrange(form.starts.data, form.ends.data)
+        )
+        db.session.add(window)
+        db.session.commit()
+    except Exception:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+
+    if error:
+        flash(
+          "An error occurred. Availability could not be added."
+        )
+        abort(400)
+
+    flash(
+      "Availability was successfully added!"
+    )
+    return redirect(url_for('artist_availability', artist_id=artist_id))
+
+@app.route('/artists/<int:artist_id>/availability/<int:window_id>/delete', methods=['POST'])
+def delete_availability(artist_id, window_id):
+    form = RemoveAvailabilityForm()
+    if not form.validate_on_submit():
+        abort(400)
+
+    try:
+        ArtistAvailability.query \
+          .filter_by(id=window_id, artist_id=artist_id) \
+          .delete()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        print(sys.exc_info())
+        abort(400)
+    finally:
+        db.session.close()
+
+    return redirect(url_for('artist_availability', artist_id=artist_id))
+
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   # Getting data from db
@@ -517,6 +551,8 @@ def edit_venue_submission(venue_id):
         venue.image_link = image_link
 
         db.session.commit()
+        suggest_index.add('venues', venue_id, name)
+        recent_listings.changed('venues', venue_id)
     except Exception:
         error = True
         db.session.rollback()
@@ -583,6 +619,8 @@ def create_artist_submission():
 
         db.session.add(artist)
         db.session.commit()
+        suggest_index.add('artists', artist.id, name)
+        recent_listings.add('artists', artist)
     except Exception:
         error = True
         db.session.rollback()
@@ -606,32 +644,95 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@replica_reads
 def shows():
   # displays list of shows at /shows
   
-    data = []
-
-    # Get data from db
-    shows = db.session.query(
-          Venue.name,
-          Artist.name,
-          Artist.image_link,
-          Show.venue_id,
-          Show.artist_id,
-          Show.start_time
-        ).filter(Venue.id == Show.venue_id, Artist.id == Show.artist_id)
-
-    # implementing data from the db into our display
-    for show in shows:
-        show = {'venue_name': Venue.name,
-          'artist_name': Artist.name,
-          'artist_image_link': Artist.image_link,
-          'venue_id': Show.venue_id,
-          'artist_id': Show.artist_id,
-          'start_time': Show.start_time}
-        data.append(show)
-
-    return render_template('pages/shows.html', shows=data)
+    # Get one page of shows from db
+    args = page_args()
+    page = cached(('venues', 'artists', 'shows'), lambda: show_page(**args))
+
+    return render_template('pages/shows.html', shows=page.items, page=page)
+
+@app.route('/shows/create/batch')
+def create_show_batch():
+  # renders the batch form, one row per show
+    form = ShowBatchForm()
+    return render_template('forms/new_show_batch.html', form=form)
+
+@app.route('/shows/create/batch', methods=['POST'])
+def create_show_batch_submission():
+  # books many shows at once, from the batch form or a JSON list of
+  # {artist_id, venue_id, start_time, end_time}; every row gets its own
+  # result
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        entries = data.get('shows') if isinstance(data, dict) else data
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            abort(400)
+    else:
+        form = ShowBatchForm()
+        entries = [
+          entry.data for entry in form.shows
+          if any(field.raw_data and field.raw_data[0].strip() for field in entry)
+        ]
+
+    if not entries or len(entries) > app.config['MAX_BATCH_SHOWS']:
+        abort(400)
+
+    error = False
+    try:
+        results = book_shows(entries)
+        db.session.commit()
+    except Exception:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+
+    if error:
+        flash(
+          "An error occurred. Shows could not be listed."
+        )
+        abort(400)
+
+    if request.is_json:
+        for result in results:
+            for name in ('start_time', 'end_time'):
+                if result.get(name) is not None:
+                    result[name] = result[name].isoformat()
+        return jsonify(results=results)
+
+    listed = sum(1 for result in results if result['id'] is not None)
+    flash(
+      "{} of {} shows were successfully listed.".format(listed, len(results))
+    )
+    return render_template('pages/show_batch.html', results=results)
+
+@app.route('/shows/export')
+def export_shows():
+  # full dump of shows with venue and artist names, streamed as it is read
+    format = request.args.get('format', 'csv')
+    if format not in FORMATS:
+        abort(400)
+
+    # request.args.get(type=...) would silently drop a malformed date
+    try:
+        start, end = [
+          datetime.fromisoformat(request.args[name]) if request.args.get(name) else None
+          for name in ('from', 'to')
+        ]
+    except ValueError:
+        abort(400)
+
+    mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return Response(
+      stream_with_context(export_chunks(format, start, end)),
+      mimetype=mimetype,
+      headers={'Content-Disposition': 'attachment; filename=shows.' + format}
+    )
 
 @app.route('/shows/create')
 def create_shows():
@@ -646,26 +747,46 @@ def create_show_submission():
   # inserting form data as a new Show record in the db
 
     error = False
-    artist_id = request.form['artist_id']
-    venue_id = request.form['venue_id']
-    start_time = request.form['start_time']
-
-    try:
-        # modifying data to be the data object returned from db insertion
-        show = Show(
-          artist_id=artist_id,
-          venue_id=venue_id,
-          start_time=start_time,
-        )
-
-        db.session.add(show)
-        db.session.commit()
-    except Exception:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-    finally:
-        db.session.close()
+    row, conflict = parse_entry(request.form)
+
+    if row is not None:
+        artist_id, venue_id, start_time, end_time = row
+        try:
+            # the artist's availability windows are checked in the database,
+            # without loading them
+            if not artist_available(artist_id, start_time, end_time):
+                conflict = 'The artist is not available at that time.'
+            else:
+                # modifying data to be the data object returned from db insertion
+                show = Show(
+                  artist_id=artist_id,
+                  venue_id=venue_id,
+                  start_time=start_time,
+                  end_time=end_time,
+                )
+
+                db.session.add(show)
+                db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            # double booking is left to the exclusion constraint, which
+            # also holds between concurrent requests
+            if is_double_booking(e):
+                conflict = 'The venue already has a show at that time.'
+            else:
+                error = True
+                print(sys.exc_info())
+        except Exception:
+            error = True
+            db.session.rollback()
+            print(sys.exc_info())
+        finally:
+            db.session.close()
+
+    if conflict:
+        form = ShowForm()
+        form.start_time.errors = [conflict]
+        return render_template('forms/new_show.html', form=form), 400
 
     # If failure
     if error:
@@ -0,0 +1,234 @@
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#----------------------------------------------------------------------------#
+
+# The read pages (listings, search and detail pages) are served by async
+# handlers over asyncpg, so a request waiting on Postgres does not hold a
+# worker; everything else is passed through to the sync Flask app, which
+# still does every write. Both share models.py, the page queries, the
+# templates and the listing cache:
+#
+#     uvicorn asgi:app --workers 4
+#
+# The page queries are the sync app's, run by AsyncSession.run_sync: their
+# round trips are awaited on the event loop like any other async query.
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from flask import render_template, request as flask_request, session as flask_session
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+
+from app import app as flask_app, conditional, not_modified, page_args
+from cache import cache, cache_key
+from models import Venue, Artist
+from queries import (
+  venue_areas, venue_validator, venue_detail,
+  artist_page, artist_validator, artist_detail,
+  show_page
+)
+from replicas import pinned_to_primary
+from search import search
+
+
+def create_engine(config):
+    # the sync app's pool profile plus its asyncpg-only connect args;
+    # asyncpg takes the application name as a server setting
+    options = dict(config['POOL_PROFILES'][config['DB_POOL_PROFILE']])
+    connect_args = dict(options.pop('connect_args', {}))
+    connect_args.update(options.pop('async_connect_args', {}))
+    connect_args.setdefault('server_settings', {'application_name': config['DB_APPLICATION_NAME'] + '-asgi'})
+    return create_async_engine(config['ASYNC_DATABASE_URI'], connect_args=connect_args, **options)
+
+
+engine = create_engine(flask_app.config)
+Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+async def form_data(request):
+    if request.method != 'POST':
+        return MultiDict()
+    return MultiDict((await request.form()).multi_items())
+
+
+def flask_context(request, form=None):
+    # a request context of the sync app built from the ASGI request, so its
+    # helpers and templates (url_for, request.args, flashed messages and
+    # the session cookie) work unchanged. Nothing is awaited while one is
+    # pushed: Flask's context locals are not safe to share across tasks
+    return flask_app.test_request_context(
+        request.url.path,
+        method=request.method,
+        query_string=request.url.query,
+        headers=[(name, value) for name, value in request.headers.items() if name != 'content-length'],
+        data=form
+    )
+
+
+def to_response(response):
+    # the sync app's response for Starlette, with the session cookie saved
+    # as Flask would once messages have been flashed or read
+    flask_app.session_interface.save_session(flask_app, flask_session._get_current_object(), response)
+    result = Response(response.get_data(), response.status_code)
+    result.raw_headers.extend(
+        (name.lower().encode('latin-1'), value.encode('latin-1'))
+        for name, value in response.headers.items()
+        if name.lower() != 'content-length'
+    )
+    return result
+
+
+def render(request, form, template, status=200, **context):
+    with flask_context(request, form):
+        return to_response(flask_app.make_response((render_template(template, **context), status)))
+
+
+async def run_query(query):
+    async with Session() as session:
+        return await session.run_sync(query)
+
+
+async def cached(request, form, tags, query):
+    # the sync app's listing cache, under the same keys, and skipped by a
+    # client that has just written, as there. Concurrent misses each run
+    # the query rather than waiting on the single-flight lock, which would
+    # block the event loop
+    with flask_context(request, form):
+        key = cache_key(flask_request.endpoint, flask_request.values)
+        pinned = pinned_to_primary()
+    if pinned:
+        return await run_query(query)
+    hit, value = cache.backend.get(key)
+    if hit:
+        return value
+
+    versions = cache.backend.tag_versions(tags)
+    value = await run_query(query)
+    cache.backend.set(key, value, None, tags, versions)
+    return value
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+async def venues(request):
+    with flask_context(request):
+        args = page_args(flask_app.config['AREA_PAGE_SIZE'])
+    page = await cached(request, MultiDict(), ('venues', 'shows'), lambda session: venue_areas(
+      datetime.now(), session=session, **args
+    ))
+
+    return render(request, None, 'pages/venues.html', areas=page.items, page=page)
+
+
+async def artists(request):
+    with flask_context(request):
+        args = page_args()
+    page = await cached(request, MultiDict(), ('artists', 'shows'), lambda session: artist_page(
+      datetime.now(), session=session, **args
+    ))
+
+    return render(request, None, 'pages/artists.html', artists=page.items, page=page)
+
+
+async def shows(request):
+    with flask_context(request):
+        args = page_args()
+    page = await cached(request, MultiDict(), ('venues', 'artists', 'shows'), lambda session: show_page(
+      session=session, **args
+    ))
+
+    return render(request, None, 'pages/shows.html', shows=page.items, page=page)
+
+
+def search_handler(model, tags, template):
+    async def handler(request):
+        form = await form_data(request)
+        search_term = form.get('search_term', '')
+        offset = form.get('offset', 0, type=int)
+
+        results = await cached(request, form, tags, lambda session: search(
+          model,
+          search_term,
+          datetime.now(),
+          limit=flask_app.config['SEARCH_PAGE_SIZE'],
+          offset=max(offset, 0),
+          session=session
+        ))
+
+        return render(request, form, template, results=results, search_term=search_term)
+    return handler
+
+
+search_venues = search_handler(Venue, ('venues', 'shows'), 'pages/search_venues.html')
+search_artists = search_handler(Artist, ('artists', 'shows'), 'pages/search_artists.html')
+
+
+def detail_handler(validator, detail, template, name):
+    # ETag revalidation as in the sync app: a matching ETag answers 304
+    # without loading the page's data
+    async def handler(request):
+        entity_id = request.path_params['id']
+        now = datetime.now()
+
+        async with Session() as session:
+            etag = await session.run_sync(lambda session: validator(entity_id, now, session))
+            if etag is None:
+                raise HTTPException(404)
+            with flask_context(request):
+                flashed = '_flashes' in flask_session
+                if not flashed and not_modified(etag):
+                    return Response(status_code=304, headers={'ETag': '"%s"' % etag})
+
+            data = await session.run_sync(lambda session: detail(entity_id, now, session))
+
+        with flask_context(request):
+            body = render_template(template, **{name: data})
+            return to_response(conditional(body, etag, flashed=flashed))
+    return handler
+
+
+show_venue = detail_handler(venue_validator, venue_detail, 'pages/show_venue.html', 'venue')
+show_artist = detail_handler(artist_validator, artist_detail, 'pages/show_artist.html', 'artist')
+
+
+async def not_found(request, exc):
+    return render(request, None, 'errors/404.html', 404)
+
+#----------------------------------------------------------------------------#
+# Launch.
+#----------------------------------------------------------------------------#
+
+@asynccontextmanager
+async def lifespan(app):
+    # the engine's connections are closed when the server stops
+    yield
+    await engine.dispose()
+
+
+# only GET (and POST for search) match here; other methods on the same
+# paths, the forms, the API and static files fall through to the sync app
+app = Starlette(
+    routes=[
+        Route('/venues', venues),
+        Route('/venues/search', search_venues, methods=['POST']),
+        Route('/venues/{id:int}', show_venue),
+        Route('/artists', artists),
+        Route('/artists/search', search_artists, methods=['POST']),
+        Route('/artists/{id:int}', show_artist),
+        Route('/shows', shows),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    exception_handlers={404: not_found},
+    lifespan=lifespan,
+)
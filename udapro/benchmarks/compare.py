@@ -0,0 +1,61 @@
+"""Compare two benchmark result files and fail on regressions.
+
+A scenario regresses when its p95 latency grows by more than --tolerance
+(a fraction), when it runs more queries per request, or when it starts
+returning errors. Exits 1 if any scenario regressed:
+
+    python -m benchmarks.compare baseline.json results.json --tolerance 0.2
+"""
+import argparse
+import json
+import sys
+
+
+def regressions(baseline, current, tolerance):
+    found = []
+    for name, before in sorted(baseline['scenarios'].items()):
+        after = current['scenarios'].get(name)
+        if after is None:
+            continue
+
+        if after['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append('{}: p95 {} ms -> {} ms'.format(name, before['p95_ms'], after['p95_ms']))
+        # query counts do not vary from run to run, so any increase counts
+        if (before['queries_per_request'] is not None and after['queries_per_request'] is not None
+                and after['queries_per_request'] > before['queries_per_request'] + 0.01):
+            found.append('{}: {} -> {} queries per request'.format(
+                name, before['queries_per_request'], after['queries_per_request']))
+        if after['errors'] > before['errors']:
+            found.append('{}: {} -> {} errors'.format(name, before['errors'], after['errors']))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed p95 growth, as a fraction of the baseline')
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline, open(args.current) as current:
+        baseline, current = json.load(baseline), json.load(current)
+
+    if baseline.get('dataset') != current.get('dataset'):
+        print('warning: datasets differ: {} vs {}'.format(baseline.get('dataset'), current.get('dataset')))
+
+    print('{:<16} {:>10} {:>10} {:>8}'.format('scenario', 'p95 before', 'p95 after', 'change'))
+    for name, before in sorted(baseline['scenarios'].items()):
+        after = current['scenarios'].get(name)
+        if after is not None:
+            change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+            print('{:<16} {:>10} {:>10} {:>+7.0%}'.format(name, before['p95_ms'], after['p95_ms'], change))
+
+    found = regressions(baseline, current, args.tolerance)
+    for regression in found:
+        print('REGRESSION ' + regression)
+    sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Micro-benchmark of the `datetime` Jinja filter.
+
+Formats the start times of a /shows page the way the filter used to,
+parsing str(start_time) back with dateutil and resolving the babel
+pattern on every call, and the way it does now. Run from udapro/:
+
+    python -m benchmarks.datetime_filter [--tiles 2000] [--distinct 200]
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from filters import DATETIME_FORMATS, format_datetime, _format_datetime
+
+
+def previous_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, DATETIME_FORMATS[format], locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiles', type=int, default=2000, help='start times on the page')
+    parser.add_argument('--distinct', type=int, default=200, help='distinct start times among them')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    first = datetime(2026, 10, 17, 20, 0)
+    values = [first + timedelta(hours=i % args.distinct) for i in range(args.tiles)]
+    strings = [str(value) for value in values]
+
+    for value, string in zip(values[:args.distinct], strings):
+        assert format_datetime(value, 'full') == previous_format_datetime(string, 'full')
+
+    def previous():
+        for string in strings:
+            previous_format_datetime(string, 'full')
+
+    def cold():
+        # a page rendered with nothing memoized yet
+        _format_datetime.cache_clear()
+        for value in values:
+            format_datetime(value, 'full')
+
+    def warm():
+        for value in values:
+            format_datetime(value, 'full')
+
+    baseline = min(timeit.repeat(previous, number=1, repeat=args.repeat))
+    print('{} tiles, {} distinct start times'.format(args.tiles, args.distinct))
+    print('{:<10} {:>10.2f} ms'.format('previous', baseline * 1000))
+    for name, run in (('cold', cold), ('warm', warm)):
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print('{:<10} {:>10.2f} ms {:>8.1f}x'.format(name, best * 1000, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Drive every route of a running Fyyur server and record latencies.
+
+Each scenario sends a fixed number of requests at a fixed concurrency and
+records p50/p95/p99 latency, throughput, errors and queries per request,
+the last read from the Server-Timing header. Run from udapro/, on a
+benchmark database; --seed replaces its contents, and --serve runs the
+app for the length of the run so that it starts on the seeded data:
+
+    python -m benchmarks.run --seed --serve --size small --output results.json
+    python -m benchmarks.compare baseline.json results.json
+
+--server asgi serves the app with uvicorn and asgi.py instead, to compare
+the two modes on the read routes.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlparse
+from urllib.request import HTTPErrorProcessor, Request, build_opener, urlopen
+
+from benchmarks.seed import SIZES, seed
+
+QUERIES = re.compile(r'db;desc="(\d+) queries"')
+
+# the routes asgi.py serves itself
+READ_SCENARIOS = [
+    'venues', 'artists', 'shows', 'venue_detail', 'artist_detail', 'search_venues', 'search_artists',
+]
+
+
+class NoRedirects(HTTPErrorProcessor):
+    # a create answers with a redirect; its target is not part of the timing
+
+    def http_response(self, request, response):
+        return response
+
+    https_response = http_response
+
+
+def scenarios(sizes, rng):
+    # name -> callable returning (method, path, form data or None)
+    venue = lambda: rng.randint(1, sizes['venues'])
+    artist = lambda: rng.randint(1, sizes['artists'])
+    word = lambda: rng.choice(['blue', 'hall', 'wolves', 'velvet', 'city 4', 'room 1'])
+    days = sizes['shows'] // sizes['venues']
+    slots = itertools.count()
+    first_slot = datetime.now().replace(second=0, microsecond=0) + timedelta(days=days // 2 + 2)
+
+    def new_show():
+        # one minute shows after the seeded ones, in slots handed out in
+        # order: a minute at every venue in turn, then the next minute, so
+        # no booking overlaps another and every create measures a success.
+        # Starting from the current minute, not a fixed time, also keeps
+        # apart runs made without --seed, unless their slots run longer
+        # than the time between them
+        slot = next(slots)
+        start = first_slot + timedelta(minutes=slot // sizes['venues'])
+        return ('POST', '/shows/create', {
+            'artist_id': artist(), 'venue_id': 1 + slot % sizes['venues'],
+            'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'end_time': (start + timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S'),
+        })
+
+    def new_entity(kind):
+        def build():
+            data = {
+                'name': 'Benchmark {} {}'.format(kind, rng.randrange(10 ** 9)),
+                'city': 'Benchmark City', 'state': 'CA', 'phone': '555-0100000',
+                'genres': 'Jazz', 'image_link': '', 'facebook_link': '',
+                'website_link': '', 'seeking_description': '',
+            }
+            if kind == 'venues':
+                data['address'] = '1 Benchmark Way'
+            return ('POST', '/{}/create'.format(kind), data)
+        return build
+
+    return [
+        ('home', lambda: ('GET', '/', None)),
+        ('venues', lambda: ('GET', '/venues', None)),
+        ('artists', lambda: ('GET', '/artists', None)),
+        ('shows', lambda: ('GET', '/shows', None)),
+        ('venue_detail', lambda: ('GET', '/venues/{}'.format(venue()), None)),
+        ('artist_detail', lambda: ('GET', '/artists/{}'.format(artist()), None)),
+        ('search_venues', lambda: ('POST', '/venues/search', {'search_term': word()})),
+        ('search_artists', lambda: ('POST', '/artists/search', {'search_term': word()})),
+        ('suggest', lambda: ('GET', '/search/suggest?' + urlencode({'q': word()[:3]}), None)),
+        ('api_venues', lambda: ('GET', '/api/v1/venues?limit=100', None)),
+        ('api_shows', lambda: ('GET', '/api/v1/shows?limit=100', None)),
+        ('api_venue', lambda: ('GET', '/api/v1/venues/{}'.format(venue()), None)),
+        ('create_venue', new_entity('venues')),
+        ('create_artist', new_entity('artists')),
+        ('create_show', new_show),
+    ]
+
+
+def send(opener, base_url, method, path, data):
+    body = urlencode(data).encode('utf-8') if data is not None else None
+    request = Request(base_url + path, data=body, method=method)
+    started = time.perf_counter()
+    try:
+        with opener.open(request) as response:
+            response.read()
+            status, headers = response.status, response.headers
+    except HTTPError as error:
+        status, headers = error.code, error.headers
+    elapsed = time.perf_counter() - started
+
+    match = QUERIES.search(headers.get('Server-Timing', ''))
+    return elapsed, status, int(match.group(1)) if match else None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(base_url, build, requests, concurrency):
+    # requests are built up front, so the random choices do not depend on
+    # how the threads interleave
+    planned = [build() for _ in range(requests)]
+    local = threading.local()
+
+    def worker(request):
+        if not hasattr(local, 'opener'):
+            local.opener = build_opener(NoRedirects)
+        return send(local.opener, base_url, *request)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(worker, planned))
+    wall = time.perf_counter() - started
+
+    latencies = [elapsed * 1000 for elapsed, _, _ in results]
+    queries = [count for _, _, count in results if count is not None]
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, status, _ in results if status >= 400),
+        'throughput_rps': round(requests / wall, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else None,
+    }
+
+
+def start_server(base_url, mode='flask', timeout=30):
+    # one process either way: flask's threaded server, or uvicorn's loop
+    port = urlparse(base_url).port or 5000
+    env = dict(os.environ, FLASK_APP='app.py', FLASK_DEBUG='0')
+    if mode == 'asgi':
+        command = ['uvicorn', 'asgi:app', '--port', str(port), '--no-access-log']
+    else:
+        command = ['flask', 'run', '--with-threads', '--port', str(port)]
+    server = subprocess.Popen(
+        [sys.executable, '-m'] + command,
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urlopen(base_url + '/').read()
+            return server
+        except (URLError, ConnectionError):
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('server did not start on {}'.format(base_url))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL) \
+            .decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small',
+                        help='dataset the server is running on, or --seed loads')
+    parser.add_argument('--seed', action='store_true',
+                        help='replace the database contents with the --size dataset first')
+    parser.add_argument('--database', help='database to seed; defaults to config.SQLALCHEMY_DATABASE_URI')
+    parser.add_argument('--serve', action='store_true', help='run the app on --url for the benchmark')
+    parser.add_argument('--server', choices=['flask', 'asgi'], default='flask', help='how --serve runs it')
+    parser.add_argument('--requests', type=int, default=200, help='per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per scenario')
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--only', help="comma separated scenario names, or 'reads'")
+    parser.add_argument('--output', help='write the results here as JSON')
+    args = parser.parse_args()
+
+    sizes = SIZES[args.size]
+    if args.seed:
+        from sqlalchemy import create_engine
+        import config
+
+        engine = create_engine(args.database or config.SQLALCHEMY_DATABASE_URI)
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            seed(connection, **sizes)
+        print('seeded {} in {:.1f}s'.format(sizes, time.perf_counter() - started))
+
+    only = set(READ_SCENARIOS if args.only == 'reads' else args.only.split(',')) if args.only else None
+    results = {
+        'revision': git_revision(),
+        'started': datetime.utcnow().isoformat() + 'Z',
+        'url': args.url,
+        'server': args.server if args.serve else None,
+        'dataset': dict(sizes, name=args.size),
+        'scenarios': {},
+    }
+
+    server = start_server(args.url, args.server) if args.serve else None
+    try:
+        print('{:<16} {:>8} {:>8} {:>8} {:>9} {:>8} {:>7}'.format(
+            'scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries', 'errors'))
+        for name, build in scenarios(sizes, random.Random(args.random_seed)):
+            if only is not None and name not in only:
+                continue
+            if args.warmup:
+                run_scenario(args.url, build, args.warmup, args.concurrency)
+            result = results['scenarios'][name] = run_scenario(args.url, build, args.requests, args.concurrency)
+            print('{:<16} {p50_ms:>8} {p95_ms:>8} {p99_ms:>8} {throughput_rps:>9} {:>8} {errors:>7}'.format(
+                name, result['queries_per_request'] if result['queries_per_request'] is not None else '-',
+                **result))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
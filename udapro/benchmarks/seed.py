@@ -0,0 +1,81 @@
+"""Seed a benchmark database with a small deterministic dataset.
+
+Everything is generated inside Postgres with generate_series, from the row
+number alone, so the same sizes always give the same rows and ids. Every
+venue hosts at most one show a day, half of the days in the past and half
+in the future; artists are skewed, a few of them playing most shows.
+"""
+from sqlalchemy import text
+
+from forms import ArtistForm, VenueForm
+
+STATES = [code for code, _ in VenueForm.state.kwargs['choices']]
+GENRES = [genre for genre, _ in ArtistForm.genres.kwargs['choices']]
+WORDS = [
+    'Blue', 'Red', 'Golden', 'Silver', 'Electric', 'Velvet', 'Midnight',
+    'Neon', 'Wild', 'Lucky', 'Iron', 'Crystal', 'Happy', 'Lonely', 'Rolling',
+]
+NOUNS = [
+    'Room', 'Hall', 'Tavern', 'Garden', 'Lounge', 'Hollow', 'Parlor',
+    'Owls', 'Wolves', 'Rivers', 'Stones', 'Echoes', 'Sparrows', 'Dreams',
+]
+
+SIZES = {
+    'small': {'venues': 200, 'artists': 1000, 'shows': 10000},
+    'medium': {'venues': 2000, 'artists': 10000, 'shows': 200000},
+    'large': {'venues': 10000, 'artists': 100000, 'shows': 2000000},
+}
+
+ENTITY_COLUMNS = """
+    {words}[1 + i % {nwords}] || ' ' || {nouns}[1 + (i / {nwords}) % {nnouns}] || ' ' || i,
+    'City ' || (i % 97),
+    {states}[1 + (i * 7) % {nstates}],
+    '555-' || lpad((i % 10000000)::text, 7, '0'),
+    ARRAY[{genres}[1 + i % {ngenres}], {genres}[1 + (i * 13) % {ngenres}]],
+    'https://example.com/images/' || i || '.jpg',
+    i % 3 = 0
+"""
+
+
+def seed(connection, venues, artists, shows):
+    """Replace every venue, artist and show with a generated dataset."""
+    params = {
+        'words': WORDS, 'nouns': NOUNS, 'states': STATES, 'genres': GENRES,
+        'venues': venues, 'artists': artists, 'shows': shows,
+    }
+    columns = ENTITY_COLUMNS.format(
+        words='CAST(:words AS text[])', nwords=len(WORDS),
+        nouns='CAST(:nouns AS text[])', nnouns=len(NOUNS),
+        states='CAST(:states AS text[])', nstates=len(STATES),
+        genres='CAST(:genres AS text[])', ngenres=len(GENRES),
+    )
+
+    connection.execute(text('TRUNCATE shows, artist_availability, venue_areas, venues, artists, locations RESTART IDENTITY CASCADE'))
+    connection.execute(text("""
+        INSERT INTO venues (name, city, state, phone, genres, image_link, seeking_talent, address)
+        SELECT {}, i || ' Main Street'
+        FROM generate_series(1, :venues) i
+    """.format(columns)), params)
+    connection.execute(text("""
+        INSERT INTO artists (name, city, state, phone, genres, image_link, seeking_venue)
+        SELECT {}
+        FROM generate_series(1, :artists) i
+    """.format(columns)), params)
+
+    # show i is on day i / venues at venue i % venues, so no venue is
+    # double booked; squaring a well spread fraction skews the artists
+    connection.execute(text("""
+        INSERT INTO shows (venue_id, artist_id, start_time, end_time)
+        SELECT venue_id, artist_id, start_time, start_time + interval '2 hours'
+        FROM (
+          SELECT
+            1 + i % :venues AS venue_id,
+            1 + floor(:artists * power((i * 0.6180339887) % 1, 2))::integer AS artist_id,
+            date_trunc('day', localtimestamp)
+              + (i / :venues - :shows / :venues / 2) * interval '1 day'
+              + interval '20 hours' AS start_time
+          FROM generate_series(0, :shows - 1) i
+        ) generated
+    """), params)
+
+    connection.execute(text('ANALYZE venues, artists, shows'))
@@ -0,0 +1,163 @@
+from datetime import datetime
+
+from psycopg2 import errorcodes
+from sqlalchemy import DateTime, Integer, cast, column, exists, func, literal, or_, select, union_all, values
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Venue, Artist, Show, ArtistAvailability, DEFAULT_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Batch show booking.
+#----------------------------------------------------------------------------#
+
+def parse_time(value):
+    # shows are stored in local time without a zone; a time with a UTC
+    # offset could be neither compared with nor matched against them
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return None
+    if not isinstance(value, datetime) or value.tzinfo is not None:
+        return None
+    return value
+
+
+def parse_entry(entry):
+    # form and JSON entries both arrive as strings, and end up as
+    # (artist_id, venue_id, start_time, end_time) or an error message
+    try:
+        artist_id = int(entry.get('artist_id'))
+        venue_id = int(entry.get('venue_id'))
+    except (TypeError, ValueError):
+        return None, 'artist_id and venue_id must be integers'
+
+    start_time = parse_time(entry.get('start_time'))
+    if start_time is None:
+        return None, 'start_time must be a local date and time, YYYY-MM-DD HH:MM'
+
+    if entry.get('end_time'):
+        end_time = parse_time(entry['end_time'])
+        if end_time is None or end_time <= start_time:
+            return None, 'end_time must be a local date and time after start_time'
+    else:
+        end_time = start_time + DEFAULT_SHOW_DURATION
+
+    return (artist_id, venue_id, start_time, end_time), None
+
+
+def existing_ids(artist_ids, venue_ids):
+    # every referenced id checked in one round trip
+    query = union_all(
+        select(literal('artist'), Artist.id).where(Artist.id.in_(artist_ids)),
+        select(literal('venue'), Venue.id).where(Venue.id.in_(venue_ids))
+    )
+    found = {'artist': set(), 'venue': set()}
+    for kind, id in db.session.execute(query):
+        found[kind].add(id)
+    return found['artist'], found['venue']
+
+
+def available(artist_id, start_time, end_time):
+    # an artist without windows can be booked any time; otherwise the show
+    # has to fall inside one. Both probes are scans of the GiST index, so
+    # the number of windows an artist has barely matters
+    windows = ArtistAvailability.artist_id == artist_id
+    show = func.tstzrange(
+      cast(start_time, DateTime(timezone=True)),
+      cast(end_time, DateTime(timezone=True))
+    )
+    return or_(
+      ~exists().where(windows),
+      exists().where(windows, ArtistAvailability.during.contains(show))
+    )
+
+
+def artist_available(artist_id, start_time, end_time):
+    return db.session.execute(select(available(artist_id, start_time, end_time))).scalar()
+
+
+def unavailable_rows(rows):
+    # the availability check for a whole batch, in one query
+    candidates = values(
+      column('row', Integer),
+      column('artist_id', Integer),
+      column('start_time', DateTime),
+      column('end_time', DateTime),
+      name='candidates'
+    ).data(rows)
+    query = select(candidates.c.row) \
+        .where(~available(candidates.c.artist_id, candidates.c.start_time, candidates.c.end_time))
+    return set(db.session.execute(query).scalars())
+
+
+def is_double_booking(error):
+    # an IntegrityError raised by the ex_shows_venue_id_during constraint
+    return getattr(error.orig, 'pgcode', None) == errorcodes.EXCLUSION_VIOLATION
+
+
+def book_shows(entries):
+    """Validate a batch of shows and insert the valid ones in one statement.
+
+    Returns one result per entry, in order, with either the new show's id
+    or the reason the entry was rejected. Valid entries are inserted even
+    if others in the batch are not; the caller commits.
+    """
+    results = []
+    rows = []
+    for number, entry in enumerate(entries, 1):
+        row, error = parse_entry(entry)
+        results.append({'row': number, 'id': None, 'error': error})
+        rows.append(row)
+
+    parsed = [row for row in rows if row is not None]
+    if not parsed:
+        return results
+    artists, venues = existing_ids(
+      {row[0] for row in parsed},
+      {row[1] for row in parsed}
+    )
+
+    pending = []
+    for result, row in zip(results, rows):
+        if row is None:
+            continue
+        artist_id, venue_id, start_time, end_time = row
+        result.update(artist_id=artist_id, venue_id=venue_id, start_time=start_time, end_time=end_time)
+        if artist_id not in artists:
+            result['error'] = 'No artist with id {}'.format(artist_id)
+        elif venue_id not in venues:
+            result['error'] = 'No venue with id {}'.format(venue_id)
+        else:
+            pending.append(result)
+
+    if pending:
+        unavailable = unavailable_rows([
+          (result['row'], result['artist_id'], result['start_time'], result['end_time'])
+          for result in pending
+        ])
+        for result in pending:
+            if result['row'] in unavailable:
+                result['error'] = 'Artist {} is not available at that time'.format(result['artist_id'])
+        pending = [result for result in pending if result['error'] is None]
+
+    if pending:
+        # one multi-row INSERT; rows the exclusion constraint turns away,
+        # whether for an existing show or an earlier row of this batch, are
+        # skipped rather than failing the batch. A venue has one show per
+        # start_time, so that finds each inserted row's entry
+        rows = [
+          {name: result[name] for name in ('artist_id', 'venue_id', 'start_time', 'end_time')}
+          for result in pending
+        ]
+        statement = insert(Show) \
+            .values(rows) \
+            .on_conflict_do_nothing() \
+            .returning(Show.id, Show.venue_id, Show.start_time)
+        inserted = {(venue_id, start_time): id for id, venue_id, start_time in db.session.execute(statement)}
+        for result in pending:
+            result['id'] = inserted.pop((result['venue_id'], result['start_time']), None)
+            if result['id'] is None:
+                result['error'] = 'Venue {} already has a show at that time'.format(result['venue_id'])
+
+    return results
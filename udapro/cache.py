@@ -0,0 +1,382 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+from urllib.parse import urlencode
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class MemoryCache(object):
+    # LRU + TTL store with tag based invalidation; also the store the
+    # socket backend's server process holds for all workers
+
+    def __init__(self, max_entries=2048, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._tags = {}
+        self._versions = {}
+        self._invalidated = {}
+        self._leases = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires, tags, value = entry
+            if expires < time.time():
+                self._drop(key)
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl=None, tags=(), versions=None):
+        with self._lock:
+            # a tag invalidated while the value was being built means it
+            # may already be stale, so it is not stored
+            if versions is not None and versions != self._tag_versions(tags):
+                return False
+            self._drop(key)
+            expires = time.time() + (ttl or self.default_ttl)
+            self._data[key] = (expires, tuple(tags), value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+            return True
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return self._tag_versions(tags)
+
+    def invalidate(self, tags):
+        with self._lock:
+            now = time.time()
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                self._invalidated[tag] = now
+                for key in list(self._tags.pop(tag, ())):
+                    self._drop(key)
+
+    def invalidated_within(self, tags, seconds):
+        with self._lock:
+            since = time.time() - seconds
+            return any(self._invalidated.get(tag, 0) > since for tag in tags)
+
+    def acquire_lease(self, key, ttl):
+        # a token for the new lease, or None while another is held; an
+        # expired lease is taken over, and its holder's release then
+        # leaves the new one in place
+        with self._lock:
+            now = time.time()
+            lease = self._leases.get(key)
+            if lease is not None and lease[0] > now:
+                return None
+            token = uuid.uuid4().hex
+            self._leases[key] = (now + ttl, token)
+            return token
+
+    def release_lease(self, key, token):
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease[1] == token:
+                del self._leases[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._leases.clear()
+
+    def _tag_versions(self, tags):
+        return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def _drop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+
+class CacheManager(BaseManager):
+    pass
+
+
+class SocketCache(object):
+    # client for a MemoryCache served over a local socket by
+    # `flask cache-server`, shared by every worker on the host
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _store(self):
+        # proxies are not shared across forked workers or threads
+        if getattr(self._local, 'pid', None) != os.getpid():
+            CacheManager.register('cache')
+            manager = CacheManager(address=self.address, authkey=self.authkey)
+            manager.connect()
+            self._local.store = manager.cache()
+            self._local.pid = os.getpid()
+        return self._local.store
+
+    def _call(self, method, *args, default=None):
+        try:
+            return getattr(self._store(), method)(*args)
+        except (OSError, EOFError):
+            # an unreachable cache server degrades to no caching
+            self._local.pid = None
+            current_app.logger.warning('cache server at %s unavailable', self.address)
+            return default
+
+    def get(self, key):
+        return self._call('get', key, default=(False, None))
+
+    def set(self, key, value, ttl=None, tags=(), versions=None):
+        return self._call('set', key, value, ttl, tags, versions, default=False)
+
+    def tag_versions(self, tags):
+        return self._call('tag_versions', tags)
+
+    def invalidate(self, tags):
+        self._call('invalidate', tags)
+
+    def invalidated_within(self, tags, seconds):
+        return self._call('invalidated_within', tags, seconds, default=True)
+
+    def acquire_lease(self, key, ttl):
+        # without the server there is nothing to coordinate on
+        return self._call('acquire_lease', key, ttl, default=uuid.uuid4().hex)
+
+    def release_lease(self, key, token):
+        self._call('release_lease', key, token)
+
+    def clear(self):
+        self._call('clear')
+
+
+class NullCache(object):
+
+    def get(self, key):
+        return False, None
+
+    def set(self, key, value, ttl=None, tags=(), versions=None):
+        return False
+
+    def tag_versions(self, tags):
+        return None
+
+    def invalidate(self, tags):
+        pass
+
+    def invalidated_within(self, tags, seconds):
+        return False
+
+    def acquire_lease(self, key, ttl):
+        return uuid.uuid4().hex
+
+    def release_lease(self, key, token):
+        pass
+
+    def clear(self):
+        pass
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+def cache_key(endpoint, args):
+    query = urlencode(sorted(args.items(multi=True)))
+    if len(query) > 200:
+        query = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    return '{}?{}'.format(endpoint, query)
+
+
+class Cache(object):
+
+    def __init__(self):
+        self.backend = NullCache()
+        self.lease_ttl = 5
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        if backend == 'memory':
+            self.backend = MemoryCache(
+              app.config['CACHE_MAX_ENTRIES'],
+              app.config['CACHE_DEFAULT_TTL']
+            )
+        elif backend == 'socket':
+            self.backend = SocketCache(
+              app.config['CACHE_SOCKET_ADDRESS'],
+              app.config['CACHE_AUTHKEY']
+            )
+        else:
+            self.backend = NullCache()
+        self.lease_ttl = app.config.get('CACHE_LEASE_TTL', 5)
+
+        app.cli.add_command(cache_server_command)
+
+    def get_or_set(self, key, builder, ttl=None, tags=(), settle=None):
+        # settle: a value built within this many seconds of one of its tags
+        # being invalidated is returned but not stored
+        hit, value = self.backend.get(key)
+        if hit:
+            return value
+
+        # single-flight: threads of this worker queue on a per-key lock,
+        # other workers on a lease held in the shared store
+        with self._flight(key):
+            hit, value = self.backend.get(key)
+            if hit:
+                return value
+
+            deadline = time.time() + self.lease_ttl
+            token = self.backend.acquire_lease(key, self.lease_ttl)
+            while token is None:
+                time.sleep(0.01)
+                hit, value = self.backend.get(key)
+                if hit:
+                    return value
+                if time.time() > deadline:
+                    break
+                token = self.backend.acquire_lease(key, self.lease_ttl)
+
+            try:
+                versions = self.backend.tag_versions(tags)
+                value = builder()
+                if not settle or not self.backend.invalidated_within(tags, settle):
+                    self.backend.set(key, value, ttl, tags, versions)
+            finally:
+                if token is not None:
+                    self.backend.release_lease(key, token)
+
+        return value
+
+    def invalidate(self, tags):
+        if tags:
+            self.backend.invalidate(tuple(tags))
+
+    def invalidate_workers(self, tags):
+        # for CLI commands: only the socket backend's store is shared with
+        # the running workers. A memory cache is this process's own, so
+        # their entries stay until they expire
+        if isinstance(self.backend, MemoryCache):
+            click.echo('CACHE_BACKEND is memory: running workers keep cached listings for up to '
+                       '{} seconds.'.format(self.backend.default_ttl), err=True)
+        self.invalidate(tags)
+
+    def _flight(self, key):
+        with self._flights_lock:
+            lock = self._flights.get(key)
+            if lock is None:
+                lock = self._flights[key] = _Flight(self, key)
+            lock.waiters += 1
+        return lock
+
+
+class _Flight(object):
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.lock = threading.Lock()
+        self.waiters = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        with self.cache._flights_lock:
+            self.waiters -= 1
+            if not self.waiters:
+                del self.cache._flights[self.key]
+
+
+cache = Cache()
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+# the tables touched by a session are collected as it flushes, and their
+# cache tags are invalidated only once the transaction has committed
+
+# rows removed by ON DELETE CASCADE never pass through the session
+DELETE_CASCADES = {
+    'venues': ('shows',),
+    'artists': ('shows',),
+}
+
+
+def _add_tags(session, table, deleted=False):
+    tags = session.info.setdefault('cache_tags', set())
+    tags.add(table)
+    if deleted:
+        tags.update(DELETE_CASCADES.get(table, ()))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    for instance in list(session.new) + list(session.dirty):
+        _add_tags(session, instance.__table__.name)
+    for instance in session.deleted:
+        _add_tags(session, instance.__table__.name, deleted=True)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tables(orm_execute_state):
+    # Query.delete()/update() and insert() statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_delete or orm_execute_state.is_update:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _add_tags(
+              orm_execute_state.session,
+              mapper.local_table.name,
+              deleted=orm_execute_state.is_delete
+            )
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_tables(session):
+    cache.invalidate(session.info.pop('cache_tags', ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_tables(session):
+    session.info.pop('cache_tags', None)
+
+#----------------------------------------------------------------------------#
+# Shared cache server.
+#----------------------------------------------------------------------------#
+
+@click.command('cache-server')
+@with_appcontext
+def cache_server_command():
+    """Serve the shared cache over CACHE_SOCKET_ADDRESS."""
+    config = current_app.config
+    store = MemoryCache(config['CACHE_MAX_ENTRIES'], config['CACHE_DEFAULT_TTL'])
+
+    CacheManager.register('cache', callable=lambda: store)
+    manager = CacheManager(address=config['CACHE_SOCKET_ADDRESS'], authkey=config['CACHE_AUTHKEY'])
+    click.echo('Serving cache on {}'.format(config['CACHE_SOCKET_ADDRESS']))
+    manager.get_server().serve_forever()
@@ -0,0 +1,322 @@
+import random
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+import click
+import psycopg2
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.engine.url import make_url
+
+from cache import cache
+from forms import ArtistForm, VenueForm
+from rollup import REFRESH_ALL
+
+#----------------------------------------------------------------------------#
+# Synthetic data generator.
+#----------------------------------------------------------------------------#
+
+# Every row is a function of (seed, table, id) or, for shows, of the
+# venue's id; chunks are generated and COPYed by worker processes in any
+# order and the database ends up the same. Ids are assigned up front.
+
+STATES = [code for code, _ in VenueForm.state.kwargs['choices']]
+GENRES = [genre for genre, _ in ArtistForm.genres.kwargs['choices']]
+
+WORDS = [
+    'Blue', 'Red', 'Golden', 'Silver', 'Electric', 'Velvet', 'Midnight', 'Neon',
+    'Wild', 'Lucky', 'Iron', 'Crystal', 'Happy', 'Lonely', 'Rolling', 'Broken',
+    'Hidden', 'Northern', 'Southern', 'Copper', 'Paper', 'Glass', 'Sleepy', 'Brave',
+]
+NOUNS = [
+    'Room', 'Hall', 'Tavern', 'Garden', 'Lounge', 'Hollow', 'Parlor', 'Barn',
+    'Owls', 'Wolves', 'Rivers', 'Stones', 'Echoes', 'Sparrows', 'Dreams', 'Kings',
+    'Harbor', 'Saloon', 'Theater', 'Cellar', 'Attic', 'Foxes', 'Lanterns', 'Waves',
+]
+CITY_PREFIXES = ['Spring', 'Fair', 'Green', 'River', 'Lake', 'Oak', 'Maple', 'Cedar',
+                 'Pine', 'Clear', 'Red', 'Rock', 'Sun', 'Ash', 'Elm', 'Glen']
+CITY_SUFFIXES = ['field', 'view', 'ville', 'ton', 'port', 'wood', 'dale', 'burg',
+                 'ford', 'haven', 'mont', 'side']
+
+# states, cities and genres are Zipf-like: a few are far more common
+STATE_WEIGHTS = [1.0 / (rank + 1) ** 0.9 for rank in range(len(STATES))]
+GENRE_WEIGHTS = [1.0 / (rank + 1) ** 0.7 for rank in range(len(GENRES))]
+CITIES_PER_STATE = 60
+
+# rows generated per COPY statement, and per worker task
+COPY_BATCH = 20000
+TASK_SIZE = 200000
+
+# share of shows played by touring artists, and how long a tour stays in
+# one state before moving to the next
+TOURING_SHARE = 0.3
+TOURING_ARTISTS = 0.05
+TOUR_LEG_DAYS = 7
+
+
+def row_random(seed, table, id):
+    return random.Random('{}:{}:{}'.format(seed, table, id))
+
+
+def pick_state(rng):
+    return rng.choices(STATES, STATE_WEIGHTS)[0]
+
+
+def pick_city(rng, state):
+    rank = int(CITIES_PER_STATE * rng.random() ** 2.5)
+    offset = STATES.index(state)
+    return CITY_PREFIXES[(rank + offset) % len(CITY_PREFIXES)] \
+        + CITY_SUFFIXES[(rank * 7 + offset) % len(CITY_SUFFIXES)]
+
+
+def pick_genres(rng):
+    genres = set(rng.choices(GENRES, GENRE_WEIGHTS, k=rng.choice((1, 1, 2, 2, 3))))
+    return '{' + ','.join('"{}"'.format(genre) for genre in sorted(genres)) + '}'
+
+
+def entity_row(seed, table, id):
+    rng = row_random(seed, table, id)
+    state = pick_state(rng)
+    name = '{} {}'.format(rng.choice(WORDS), rng.choice(NOUNS))
+    if rng.random() < 0.5:
+        name = 'The ' + name
+    slug = '{}-{}'.format(name.lower().replace(' ', '-'), id)
+    seeking = rng.random() < 0.3
+
+    row = [
+        id, '{} {}'.format(name, id), pick_city(rng, state), state,
+        '{:03d}-{:03d}-{:04d}'.format(rng.randrange(200, 1000), rng.randrange(1000), rng.randrange(10000)),
+        pick_genres(rng),
+        'https://images.example.com/{}/{}.jpg'.format(table, id),
+        'https://www.facebook.com/{}'.format(slug),
+        'https://{}.example.com'.format(slug),
+        't' if seeking else 'f',
+        'Looking for {} acts'.format(rng.choice(GENRES)) if seeking else '\\N',
+    ]
+    if table == 'venues':
+        row.append('{} {} Street'.format(rng.randrange(1, 9999), rng.choice(NOUNS)))
+    return row
+
+
+ENTITY_COLUMNS = {
+    'venues': ['id', 'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+               'website_link', 'seeking_talent', 'seeking_description', 'address'],
+    'artists': ['id', 'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+                'website_link', 'seeking_venue', 'seeking_description'],
+}
+SHOW_COLUMNS = ['id', 'venue_id', 'artist_id', 'start_time', 'end_time']
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+def show_counts(seed, venues, shows, days):
+    # popular venues host many more shows: Pareto weights, capped at one
+    # show a day, shared out so the counts add up to exactly `shows`
+    rng = random.Random('{}:venue-popularity'.format(seed))
+    weights = [rng.paretovariate(1.2) for _ in range(venues)]
+
+    counts = [0] * venues
+    remaining = shows
+    open_venues = list(range(venues))
+    while remaining and open_venues:
+        total = sum(weights[v] for v in open_venues)
+        shares = {v: remaining * weights[v] / total for v in open_venues}
+        for v in open_venues:
+            counts[v] += int(min(shares[v], days - counts[v]))
+        remaining = shows - sum(counts)
+        open_venues = [v for v in open_venues if counts[v] < days]
+        # the fractions left over go one each to the heaviest venues
+        if remaining and remaining < len(open_venues):
+            for v in sorted(open_venues, key=lambda v: shares[v] % 1, reverse=True)[:remaining]:
+                counts[v] += 1
+            remaining = 0
+    return counts
+
+
+def pick_artist(rng, artists, state, day):
+    # touring artists move one state per leg, so on a given day each state
+    # has its own set of them; anyone else is drawn with a strong skew
+    # towards the low, "popular" ids
+    touring = max(1, int(artists * TOURING_ARTISTS))
+    if rng.random() < TOURING_SHARE and touring >= len(STATES):
+        position = (STATES.index(state) - day // TOUR_LEG_DAYS) % len(STATES)
+        legs = (touring - 1 - position) // len(STATES) + 1
+        return 1 + position + len(STATES) * rng.randrange(legs)
+    return 1 + int(artists * rng.random() ** 3)
+
+
+def show_rows(seed, first_venue, counts, first_id, artists, first_day, days):
+    id = first_id
+    for venue_id, count in enumerate(counts, first_venue):
+        rng = row_random(seed, 'shows', venue_id)
+        state = pick_state(row_random(seed, 'venues', venue_id))
+        for day in sorted(rng.sample(range(days), count)):
+            start = first_day + timedelta(days=day, hours=19, minutes=30 * rng.randrange(8))
+            end = start + timedelta(minutes=30 * rng.randrange(3, 7))
+            yield [id, venue_id, pick_artist(rng, artists, state, day), start, end]
+            id += 1
+
+#----------------------------------------------------------------------------#
+# Loading.
+#----------------------------------------------------------------------------#
+
+class LineStream(object):
+    # file-like view of rows as COPY text lines, read by copy_expert
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+
+    def read(self, size=-1):
+        lines = []
+        length = len(self.buffer)
+        for row in self.rows:
+            line = '\t'.join(str(value) for value in row) + '\n'
+            lines.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = self.buffer + ''.join(lines)
+        if size < 0:
+            self.buffer = ''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+
+_connection = None
+
+
+def _connect(connect_args):
+    global _connection
+    _connection = psycopg2.connect(**connect_args)
+
+
+def _copy(task):
+    table, columns, rows = task
+    rows = build_rows(*rows)
+    count = 0
+    with _connection.cursor() as cursor:
+        while True:
+            batch = [row for _, row in zip(range(COPY_BATCH), rows)]
+            if not batch:
+                break
+            cursor.copy_expert(
+                'COPY {} ({}) FROM STDIN'.format(table, ', '.join(columns)),
+                LineStream(iter(batch))
+            )
+            count += len(batch)
+    _connection.commit()
+    return table, count
+
+
+def build_rows(kind, *args):
+    if kind == 'shows':
+        return show_rows(*args)
+    seed, table, first, last = args
+    return (entity_row(seed, table, id) for id in range(first, last + 1))
+
+
+def entity_tasks(seed, table, count):
+    for first in range(1, count + 1, TASK_SIZE):
+        last = min(first + TASK_SIZE - 1, count)
+        yield table, ENTITY_COLUMNS[table], ('entity', seed, table, first, last)
+
+
+def show_tasks(seed, counts, artists, first_day, days):
+    # venues are split so each task carries about TASK_SIZE shows
+    first_venue = 0
+    first_id = 1
+    while first_venue < len(counts):
+        last_venue = first_venue
+        total = 0
+        while last_venue < len(counts) and (total < TASK_SIZE or last_venue == first_venue):
+            total += counts[last_venue]
+            last_venue += 1
+        yield 'shows', SHOW_COLUMNS, (
+            'shows', seed, first_venue + 1, counts[first_venue:last_venue],
+            first_id, artists, first_day, days
+        )
+        first_venue = last_venue
+        first_id += total
+
+
+def run_tasks(pool, tasks, label):
+    started = time.time()
+    rows = 0
+    for table, count in pool.imap_unordered(_copy, tasks):
+        rows += count
+    elapsed = time.time() - started
+    click.echo('{}: {} rows in {:.1f}s ({:.0f} rows/s)'.format(label, rows, elapsed, rows / max(elapsed, 1e-6)))
+    return rows
+
+
+@click.command('generate')
+@click.option('--venues', default=100000, show_default=True)
+@click.option('--artists', default=1000000, show_default=True)
+@click.option('--shows', default=50000000, show_default=True)
+@click.option('--days', default=1460, show_default=True, help='Days the shows are spread over.')
+@click.option('--anchor', type=click.DateTime(['%Y-%m-%d']), help='Middle of that span; defaults to today.')
+@click.option('--seed', default=1, show_default=True)
+@click.option('--workers', default=4, show_default=True, help='Processes generating and COPYing rows.')
+@click.option('--truncate', is_flag=True, help='Empty the tables first.')
+@with_appcontext
+def generate_command(venues, artists, shows, days, anchor, seed, workers, truncate):
+    """Fill the database with a seeded synthetic dataset.
+
+    The same options always produce the same rows. Half of the shows are
+    in the past and half in the future, around --anchor; pass it to make
+    a run reproducible from one day to the next.
+    """
+    if shows > venues * days:
+        raise click.UsageError('At one show a day, {} venues cannot host {} shows in {} days.'
+                               .format(venues, shows, days))
+
+    url = make_url(current_app.config['SQLALCHEMY_DATABASE_URI'])
+    connect_args = dict(url.translate_connect_args(username='user', database='dbname'), **url.query)
+    connect_args['application_name'] = current_app.config['DB_APPLICATION_NAME'] + '-generate'
+
+    connection = psycopg2.connect(**connect_args)
+    with connection, connection.cursor() as cursor:
+        if truncate:
+            cursor.execute('TRUNCATE shows, artist_availability, venue_areas, venues, artists, locations RESTART IDENTITY CASCADE')
+        else:
+            cursor.execute('SELECT EXISTS (SELECT 1 FROM venues) OR EXISTS (SELECT 1 FROM artists)')
+            if cursor.fetchone()[0]:
+                raise click.UsageError('The database already has data; pass --truncate to replace it.')
+
+    anchor = (anchor or datetime.now()).date()
+    first_day = datetime.combine(anchor - timedelta(days=days // 2), datetime.min.time())
+    counts = show_counts(seed, venues, shows, days)
+
+    # the workers skip the venue_areas triggers, which would recompute the
+    # areas of every COPY batch under their row locks; the rollup is built
+    # once the data is in
+    worker_args = dict(connect_args)
+    worker_args['options'] = (worker_args.get('options', '') + ' -c venue_areas.deferred=on').strip()
+
+    with Pool(workers, initializer=_connect, initargs=(worker_args,)) as pool:
+        run_tasks(pool, list(entity_tasks(seed, 'venues', venues)) + list(entity_tasks(seed, 'artists', artists)),
+                  'venues and artists')
+        run_tasks(pool, show_tasks(seed, counts, artists, first_day, days), 'shows')
+
+    with connection, connection.cursor() as cursor:
+        for table in ('venues', 'artists', 'shows'):
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), coalesce((SELECT max(id) FROM {0}), 0) + 1, false)"
+                .format(table)
+            )
+        started = time.time()
+        cursor.execute(REFRESH_ALL)
+        click.echo('venue areas: {} in {:.1f}s'.format(cursor.fetchone()[0], time.time() - started))
+
+    # the rows were COPYed, past the ORM's cache invalidation
+    cache.invalidate_workers(('venues', 'artists', 'shows'))
+
+    # ANALYZE cannot run inside a transaction block
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE venues, artists, shows')
+    connection.close()
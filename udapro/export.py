@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+
+import click
+from flask.cli import with_appcontext
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Shows export.
+#----------------------------------------------------------------------------#
+
+COLUMNS = ['id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name']
+
+FORMATS = ('csv', 'ndjson')
+
+# rows fetched per round trip from the server-side cursor, and written
+# per chunk of output
+BATCH_SIZE = 5000
+
+
+def show_rows(start=None, end=None, batch_size=BATCH_SIZE):
+    # a server-side cursor read batch_size rows at a time, so memory stays
+    # flat however many shows match
+    query = db.session \
+        .query(
+            Show.id,
+            Show.start_time,
+            Show.venue_id,
+            Venue.name,
+            Show.artist_id,
+            Artist.name
+        ) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id)
+
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+
+    return query \
+        .order_by(Show.start_time, Show.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(batch_size)
+
+
+def csv_chunks(rows, batch_size=BATCH_SIZE):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow((row[0], row[1].isoformat()) + tuple(row[2:]))
+        if count % batch_size == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate(0)
+
+    yield out.getvalue()
+
+
+def ndjson_chunks(rows, batch_size=BATCH_SIZE):
+    lines = []
+
+    for row in rows:
+        data = dict(zip(COLUMNS, row))
+        data['start_time'] = row[1].isoformat()
+        lines.append(json.dumps(data) + '\n')
+        if len(lines) == batch_size:
+            yield ''.join(lines)
+            lines = []
+
+    yield ''.join(lines)
+
+
+def export_chunks(format, start=None, end=None):
+    chunks = csv_chunks if format == 'csv' else ndjson_chunks
+    return chunks(show_rows(start, end))
+
+
+@click.command('export-shows')
+@click.option('--format', 'format', type=click.Choice(FORMATS), default='csv')
+@click.option('--from', 'start', type=click.DateTime(), help='Shows starting at or after this time.')
+@click.option('--to', 'end', type=click.DateTime(), help='Shows starting before this time.')
+@click.option('--output', type=click.File('w'), default='-', help='Defaults to stdout.')
+@with_appcontext
+def export_shows_command(format, start, end, output):
+    """Stream every show, with venue and artist names, as CSV or NDJSON."""
+    for chunk in export_chunks(format, start, end):
+        output.write(chunk)
+    output.flush()
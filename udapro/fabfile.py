@@ -1,4 +1,6 @@
-from fabric.api import local, settings, abort
+import os
+
+from fabric.api import local, settings, abort, warn
 from fabric.contrib.console import confirm
 
 # prepare for deployment
@@ -27,6 +29,38 @@ def prepare():
     commit()
     push()
 
+# benchmark against a baseline; a regression fails the task. Without a
+# baseline there is nothing to compare, and the results can become one
+
+
+def benchmark(size='small', baseline='benchmarks/baseline.json'):
+    local(
+        "python -m benchmarks.run --seed --serve --size {} --output benchmarks/results.json".format(size)
+    )
+    if not os.path.exists(baseline):
+        warn("No baseline at {0}; copy benchmarks/results.json there to compare later runs against it.".format(baseline))
+        return
+    with settings(warn_only=True):
+        result = local(
+            "python -m benchmarks.compare {} benchmarks/results.json".format(baseline)
+        )
+    if result.failed:
+        abort("Benchmark regressed against {}.".format(baseline))
+
+
+# the read routes served by the sync app, then by asgi.py, on the same data
+
+
+def benchmark_modes(size='small'):
+    local(
+        "python -m benchmarks.run --seed --serve --size {} --only reads --output benchmarks/results-flask.json".format(size)
+    )
+    local(
+        "python -m benchmarks.run --serve --server asgi --size {} --only reads --output benchmarks/results-asgi.json".format(size)
+    )
+    with settings(warn_only=True):
+        local("python -m benchmarks.compare benchmarks/results-flask.json benchmarks/results-asgi.json")
+
 # deploy to heroku
 
 
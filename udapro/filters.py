@@ -0,0 +1,36 @@
+from datetime import datetime
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+
+#----------------------------------------------------------------------------#
+# Jinja filters.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def datetime_pattern(format, locale):
+    # the parsed babel pattern and locale data, resolved once per pair
+    return parse_pattern(DATETIME_FORMATS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=8192)
+def _format_datetime(value, format, locale):
+    # a page repeats the same few start times many times over; none of the
+    # patterns print a time zone, so the naive value is formatted as is
+    pattern, locale = datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    # datetimes are formatted directly; strings are still accepted
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    return _format_datetime(value, format, locale)
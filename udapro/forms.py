@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import Form as BaseForm, StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, FieldList, FormField
+from wtforms.validators import DataRequired, AnyOf, URL, Optional
 
 class ShowForm(Form):
     artist_id = StringField(
@@ -15,6 +15,45 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()]
+    )
+
+class ShowEntryForm(BaseForm):
+    # one row of ShowBatchForm; rows are validated together on submit, and
+    # times parsed there like the JSON ones, with or without seconds
+    artist_id = StringField(
+        'artist_id'
+    )
+    venue_id = StringField(
+        'venue_id'
+    )
+    start_time = StringField(
+        'start_time'
+    )
+    end_time = StringField(
+        'end_time'
+    )
+
+class ShowBatchForm(Form):
+    shows = FieldList(
+        FormField(ShowEntryForm),
+        min_entries=10
+    )
+
+class AvailabilityForm(Form):
+    # times are typed to the minute, as the page prompts
+    starts = DateTimeField(
+        'starts', validators=[DataRequired()], format='%Y-%m-%d %H:%M'
+    )
+    ends = DateTimeField(
+        'ends', validators=[DataRequired()], format='%Y-%m-%d %H:%M'
+    )
+
+class RemoveAvailabilityForm(Form):
+    # no fields; only the CSRF token is checked
+    pass
 
 class VenueForm(Form):
     name = StringField(
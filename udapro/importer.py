@@ -0,0 +1,337 @@
+import csv
+import io
+import json
+import os
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from cache import cache, DELETE_CASCADES
+from models import db, DEFAULT_SHOW_DURATION
+from rollup import DEFER_TRIGGERS
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+ENTITY_COLUMNS = [
+    'id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+    'facebook_link', 'website_link', 'seeking_description',
+]
+
+SPECS = {
+    'venues': {
+        'columns': ENTITY_COLUMNS + ['address', 'seeking_talent'],
+        'required': ['name', 'city', 'state'],
+    },
+    'artists': {
+        'columns': ENTITY_COLUMNS + ['seeking_venue'],
+        'required': ['name', 'city', 'state'],
+    },
+    'shows': {
+        'columns': ['id', 'venue_id', 'artist_id', 'start_time', 'end_time'],
+        'required': ['venue_id', 'artist_id', 'start_time'],
+    },
+}
+
+# kinds whose rows are counted in the venue_areas rollup
+AREA_KINDS = ('venues', 'shows')
+
+BOOLEAN_COLUMNS = ('seeking_talent', 'seeking_venue')
+
+INTEGER_COLUMNS = ('id', 'venue_id', 'artist_id')
+
+TIMESTAMP_PATTERN = r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?$'
+
+# the pattern lets through dates and times that do not exist, such as
+# 2026-02-30 25:61, whose cast would abort the whole import; this casts
+# one value, NULL when it is not a timestamp
+TRY_TIMESTAMP = """
+    CREATE OR REPLACE FUNCTION pg_temp.try_timestamp(value text) RETURNS timestamp AS $$
+    BEGIN
+      RETURN value::timestamp;
+    EXCEPTION WHEN data_exception THEN
+      RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+# a show's end_time, DEFAULT_SHOW_DURATION after it starts when not given;
+# qualified, as it is also used inside subqueries over shows
+show_end_time = "coalesce(NULLIF(staging.end_time, '')::timestamp, " \
+    "staging.start_time::timestamp + interval '{} seconds')" \
+    .format(int(DEFAULT_SHOW_DURATION.total_seconds()))
+
+
+def cast(column):
+    # staging columns are all text; this is how each lands in the table
+    if column in INTEGER_COLUMNS:
+        return "NULLIF({0}, '')::integer".format(column)
+    if column in BOOLEAN_COLUMNS:
+        return "coalesce(lower(trim({0})) IN ('1', 't', 'true', 'y', 'yes'), false)".format(column)
+    if column == 'genres':
+        return r"regexp_split_to_array(NULLIF(trim(genres), ''), '\s*[;,]\s*')"
+    if column == 'start_time':
+        return 'start_time::timestamp'
+    if column == 'end_time':
+        return show_end_time
+    return "NULLIF({0}, '')".format(column)
+
+
+class NdjsonAsCsv(object):
+    # file-like view of an NDJSON file as CSV, for COPY ... FROM STDIN
+
+    def __init__(self, lines, columns):
+        self.lines = lines
+        self.columns = columns
+        self.buffer = ''
+
+    def read(self, size=-1):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        while size < 0 or len(self.buffer) + out.tell() < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if isinstance(data.get('genres'), list):
+                data['genres'] = ';'.join(data['genres'])
+            writer.writerow([data.get(column) for column in self.columns])
+
+        data = self.buffer + out.getvalue()
+        if size < 0:
+            self.buffer = ''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def copy_into_staging(cursor, kind, file, format):
+    spec = SPECS[kind]
+    cursor.execute(
+        'CREATE TEMP TABLE staging (line bigserial, valid boolean NOT NULL DEFAULT true, reason text, {}) ON COMMIT DROP'
+        .format(', '.join('{} text'.format(column) for column in spec['columns']))
+    )
+
+    if format == 'csv':
+        header = next(csv.reader([file.readline()]))
+        columns = [column.strip() for column in header]
+        unknown = set(columns) - set(spec['columns'])
+        if unknown:
+            raise click.UsageError('Unknown {} columns: {}'.format(kind, ', '.join(sorted(unknown))))
+        source = file
+    else:
+        columns = spec['columns']
+        source = NdjsonAsCsv(iter(file), columns)
+
+    cursor.copy_expert(
+        'COPY staging ({}) FROM STDIN WITH (FORMAT csv)'.format(', '.join(columns)),
+        source
+    )
+    cursor.execute('SELECT count(*) FROM staging')
+    return cursor.fetchone()[0]
+
+
+def reject(cursor, checks, guard=None):
+    # one pass marking the rows that fail any (condition, reason) check,
+    # each with the reason of the first check it fails; guard, if given,
+    # must hold before any condition is looked at
+    failing = ' OR '.join('({})'.format(condition) for condition, _ in checks)
+    if guard is not None:
+        failing = 'CASE WHEN {} THEN {} END'.format(guard, failing)
+    cursor.execute("""
+        UPDATE staging SET valid = false, reason = CASE {} END
+        WHERE valid AND {}
+    """.format(
+        ' '.join("WHEN {} THEN '{}'".format(condition, reason) for condition, reason in checks),
+        failing
+    ))
+
+
+def validate_staging(cursor, kind):
+    # every check is one set-based pass over the staging table
+    spec = SPECS[kind]
+    checks = [("coalesce(trim({0}), '') = ''".format(column), '{} is required'.format(column))
+              for column in spec['required']]
+    checks += [(r"{0} !~ '^\s*\d{{0,9}}\s*$'".format(column), '{} must be an integer'.format(column))
+               for column in INTEGER_COLUMNS if column in spec['columns']]
+    if kind == 'shows':
+        cursor.execute(TRY_TIMESTAMP)
+        checks.append((
+            "start_time !~ '{}' OR pg_temp.try_timestamp(start_time) IS NULL".format(TIMESTAMP_PATTERN),
+            'start_time must be a date and time'
+        ))
+        checks.append((
+            "coalesce(end_time, '') <> '' AND (end_time !~ '{}' OR pg_temp.try_timestamp(end_time) IS NULL)"
+            .format(TIMESTAMP_PATTERN),
+            'end_time must be a date and time'
+        ))
+    reject(cursor, checks)
+
+    # a repeated id keeps its last row
+    cursor.execute("""
+        UPDATE staging SET valid = false, reason = 'id repeated further down the file'
+        FROM (
+          SELECT line, row_number() OVER (PARTITION BY trim(id) ORDER BY line DESC) AS n
+          FROM staging WHERE valid AND coalesce(trim(id), '') <> ''
+        ) duplicates
+        WHERE duplicates.line = staging.line AND duplicates.n > 1
+    """)
+
+    if kind == 'shows':
+        # CASE, unlike AND, guarantees the casts only see rows that passed
+        reject(cursor, [
+            ('NOT EXISTS (SELECT 1 FROM venues WHERE venues.id = trim(staging.venue_id)::integer)',
+             'no venue with this venue_id'),
+            ('NOT EXISTS (SELECT 1 FROM artists WHERE artists.id = trim(staging.artist_id)::integer)',
+             'no artist with this artist_id'),
+            ('{} <= start_time::timestamp'.format(show_end_time),
+             'end_time must be after start_time'),
+        ], guard='valid')
+
+        # double bookings would trip ex_shows_venue_id_during and fail the
+        # whole import, so they are rejected first: rows overlapping a show
+        # already booked, probed through the constraint's GiST index, then,
+        # among the rows left, those overlapping an earlier row for the same
+        # venue, found in one ordered pass
+        reject(cursor, [(
+            """EXISTS (
+              SELECT 1 FROM shows
+              WHERE shows.venue_id = trim(staging.venue_id)::integer
+                AND tsrange(shows.start_time, shows.end_time)
+                    && tsrange(staging.start_time::timestamp, {end_time})
+                AND shows.id IS DISTINCT FROM NULLIF(trim(staging.id), '')::integer
+            )""".format(end_time=show_end_time),
+            'overlaps a show already booked at the venue'
+        )], guard='valid')
+        cursor.execute("""
+            UPDATE staging SET valid = false, reason = 'overlaps an earlier row at the same venue'
+            FROM (
+              SELECT line, start_time::timestamp AS starts, max({end_time}) OVER (
+                PARTITION BY trim(venue_id) ORDER BY start_time::timestamp, line
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+              ) AS previous_end
+              FROM staging WHERE valid
+            ) ordered
+            WHERE ordered.line = staging.line AND ordered.previous_end > ordered.starts
+        """.format(end_time=show_end_time))
+
+
+# staged ids of the rows to merge; only valid rows are read, so the cast
+# cannot fail
+STAGED_IDS = "SELECT NULLIF(trim(staging.{}), '')::integer FROM staging WHERE staging.valid"
+
+
+def defer_venue_areas(cursor, kind):
+    # the venue_areas triggers are skipped for the transaction, so the
+    # merge does not update areas under their row locks statement by
+    # statement; the areas rows leave are noted now and those they join
+    # after the merge, and all of them refreshed once. Returns the last
+    # venue id before the merge, past which venues are new
+    cursor.execute(DEFER_TRIGGERS.format('LOCAL'))
+    if kind == 'venues':
+        touched = 'id IN ({})'.format(STAGED_IDS.format('id'))
+    else:
+        touched = 'id IN ({}) OR id IN (SELECT venue_id FROM shows WHERE id IN ({}))' \
+            .format(STAGED_IDS.format('venue_id'), STAGED_IDS.format('id'))
+    cursor.execute('CREATE TEMP TABLE touched_areas ON COMMIT DROP AS SELECT state, city FROM venues WHERE ' + touched)
+    cursor.execute('SELECT coalesce(max(id), 0) FROM venues')
+    return cursor.fetchone()[0]
+
+
+def refresh_touched_areas(cursor, kind, last_venue):
+    if kind == 'venues':
+        cursor.execute(
+            'INSERT INTO touched_areas SELECT state, city FROM venues WHERE id IN ({}) OR id > %s'
+            .format(STAGED_IDS.format('id')),
+            (last_venue,)
+        )
+    cursor.execute("""
+        SELECT coalesce(refresh_venue_areas(array_agg(state::text), array_agg(city::text)), 0)
+        FROM (SELECT DISTINCT state, city FROM touched_areas) areas
+    """)
+
+
+def merge_staging(cursor, kind):
+    columns = [column for column in SPECS[kind]['columns'] if column != 'id']
+    cursor.execute("""
+        INSERT INTO {table} (id, {columns})
+        SELECT coalesce(NULLIF(trim(id), '')::integer, nextval(pg_get_serial_sequence('{table}', 'id'))), {values}
+        FROM staging WHERE valid
+        ORDER BY line
+        ON CONFLICT (id) DO UPDATE SET {updates},
+          version = {table}.version + 1,
+          updated_at = timezone('utc', now())
+    """.format(
+        table=kind,
+        columns=', '.join(columns),
+        values=', '.join(cast(column) for column in columns),
+        updates=', '.join('{0} = EXCLUDED.{0}'.format(column) for column in columns)
+    ))
+    merged = cursor.rowcount
+
+    # explicit ids from the file must not be handed out again
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence('{0}', 'id'), coalesce((SELECT max(id) FROM {0}), 0) + 1, false)"
+        .format(kind)
+    )
+    return merged
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(SPECS)))
+@click.argument('file', type=click.File('r'))
+@click.option('--format', 'format', type=click.Choice(('csv', 'ndjson')),
+              help='Defaults to the file extension.')
+@click.option('--rejects', type=click.File('w'), help='Write rejected rows here as CSV.')
+@with_appcontext
+def import_command(kind, file, format, rejects):
+    """Bulk load venues, artists or shows from CSV or NDJSON.
+
+    Rows are COPYed into a staging table, validated and merged into the
+    real table in set-based SQL, all in one transaction.
+    """
+    if format is None:
+        format = 'ndjson' if os.path.splitext(file.name)[1] in ('.ndjson', '.jsonl') else 'csv'
+
+    cursor = db.session.connection().connection.cursor()
+    started = time.time()
+    try:
+        staged = copy_into_staging(cursor, kind, file, format)
+        copied = time.time()
+
+        validate_staging(cursor, kind)
+        if kind in AREA_KINDS:
+            last_venue = defer_venue_areas(cursor, kind)
+        merged = merge_staging(cursor, kind)
+        if kind in AREA_KINDS:
+            refresh_touched_areas(cursor, kind, last_venue)
+
+        if rejects is not None:
+            # psycopg2 only decodes COPY output for io text streams, which
+            # click's lazily opened file is not
+            rejected = io.StringIO()
+            cursor.copy_expert(
+                'COPY (SELECT line, reason, {} FROM staging WHERE NOT valid ORDER BY line) '
+                'TO STDOUT WITH (FORMAT csv, HEADER)'.format(', '.join(SPECS[kind]['columns'])),
+                rejected
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if rejects is not None:
+        rejects.write(rejected.getvalue())
+
+    # COPY and raw SQL bypass the ORM session events
+    cache.invalidate_workers((kind,) + DELETE_CASCADES.get(kind, ()))
+
+    finished = time.time()
+    click.echo('{}: {} rows staged in {:.1f}s ({:.0f} rows/s)'.format(
+        kind, staged, copied - started, staged / max(copied - started, 1e-6)))
+    click.echo('{}: {} rows merged, {} rejected, {:.1f}s total ({:.0f} rows/s)'.format(
+        kind, merged, staged - merged, finished - started, staged / max(finished - started, 1e-6)))
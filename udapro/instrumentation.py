@@ -0,0 +1,112 @@
+import time
+from collections import Counter
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#----------------------------------------------------------------------------#
+
+# per request, kept on flask.g: query count and time, template render
+# time, and how often each statement ran; reported in a Server-Timing
+# header and logged when a request crosses a threshold
+
+
+class RequestTimings(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.statements = Counter()
+        self._renders = []
+
+    def repeated_statements(self, threshold):
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count > threshold]
+
+    def server_timing(self, total):
+        return 'db;desc="{} queries";dur={:.1f}, render;dur={:.1f}, total;dur={:.1f}'.format(
+            self.queries, self.db_time * 1000, self.render_time * 1000, total * 1000)
+
+
+def current_timings():
+    if has_request_context():
+        return g.get('timings')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    timings = current_timings()
+    if timings is not None:
+        timings.queries += 1
+        timings.db_time += elapsed
+        # the statement text is parametrized, so a query run once per row
+        # of a page is the same string every time
+        timings.statements[statement] += 1
+
+
+def _start_render(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None:
+        timings._renders.append(time.perf_counter())
+
+
+def _end_render(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None and timings._renders:
+        started = timings._renders.pop()
+        # only the outermost render counts; nested ones are inside it
+        if not timings._renders:
+            timings.render_time += time.perf_counter() - started
+
+
+def init_instrumentation(app):
+    if not app.config['INSTRUMENTATION']:
+        return
+
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_end_render, app)
+
+    @app.before_request
+    def start_timings():
+        g.timings = RequestTimings()
+
+    @app.after_request
+    def report_timings(response):
+        timings = current_timings()
+        if timings is None:
+            return response
+
+        # a streamed body is produced after this point, so its queries
+        # are not in the header
+        total = time.perf_counter() - timings.started
+        response.headers['Server-Timing'] = timings.server_timing(total)
+
+        config = app.config
+        if (total * 1000 > config['SLOW_REQUEST_MS']
+                or timings.db_time * 1000 > config['SLOW_DB_MS']
+                or timings.queries > config['MAX_QUERIES_PER_REQUEST']):
+            app.logger.warning(
+                'slow request %s %s: %.1f ms, %d queries in %.1f ms, render %.1f ms',
+                request.method, request.full_path.rstrip('?'), total * 1000,
+                timings.queries, timings.db_time * 1000, timings.render_time * 1000
+            )
+
+        for statement, count in timings.repeated_statements(config['N_PLUS_ONE_THRESHOLD']):
+            app.logger.warning(
+                'possible N+1 in %s %s: statement ran %d times: %s',
+                request.method, request.path, count, ' '.join(statement.split())[:300]
+            )
+
+        return response
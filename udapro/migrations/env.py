@@ -46,7 +46,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        transaction_per_migration=True
     )
 
     with context.begin_transaction():
@@ -73,12 +74,18 @@ def run_migrations_online():
 
     connectable = current_app.extensions['migrate'].db.get_engine()
 
+    # every revision runs in its own transaction, so a revision can step
+    # out of it with op.get_context().autocommit_block() for statements
+    # such as CREATE INDEX CONCURRENTLY that refuse to run in a transaction
+    configure_args = dict(current_app.extensions['migrate'].configure_args)
+    configure_args.setdefault('transaction_per_migration', True)
+
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
-            **current_app.extensions['migrate'].configure_args
+            **configure_args
         )
 
         with context.begin_transaction():
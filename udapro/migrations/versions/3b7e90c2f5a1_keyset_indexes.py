@@ -0,0 +1,42 @@
+"""keyset pagination indexes
+
+Revision ID: 3b7e90c2f5a1
+Revises: c4d9a2e61b3f
+Create Date: 2026-10-17 11:26:53.092317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e90c2f5a1'
+down_revision = 'c4d9a2e61b3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venues_state_city_id', 'venues',
+                        ['state', 'city', 'id'],
+                        postgresql_concurrently=True)
+        # (start_time, id) is the /shows ordering; it also serves every
+        # query the plain start_time index did
+        op.create_index('ix_shows_start_time_id', 'shows',
+                        ['start_time', 'id'],
+                        postgresql_include=['venue_id', 'artist_id'],
+                        postgresql_concurrently=True)
+        op.drop_index('ix_shows_start_time', table_name='shows',
+                      postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_shows_start_time', 'shows', ['start_time'],
+                        postgresql_include=['venue_id', 'artist_id'],
+                        postgresql_concurrently=True)
+        op.drop_index('ix_shows_start_time_id', table_name='shows',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_venues_state_city_id', table_name='venues',
+                      postgresql_concurrently=True)
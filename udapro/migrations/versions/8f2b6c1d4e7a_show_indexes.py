@@ -0,0 +1,41 @@
+"""shows indexes
+
+Revision ID: 8f2b6c1d4e7a
+Revises: 5225374683cd
+Create Date: 2026-10-17 09:12:04.118240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2b6c1d4e7a'
+down_revision = '5225374683cd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY keeps the table writable while the indexes build, but
+    # it cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_shows_venue_id_start_time', 'shows',
+                        ['venue_id', 'start_time'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_shows_artist_id_start_time', 'shows',
+                        ['artist_id', 'start_time'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_shows_start_time', 'shows', ['start_time'],
+                        postgresql_include=['venue_id', 'artist_id'],
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_shows_start_time', table_name='shows',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_shows_artist_id_start_time', table_name='shows',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_shows_venue_id_start_time', table_name='shows',
+                      postgresql_concurrently=True)
@@ -0,0 +1,36 @@
+"""artist availability windows
+
+Revision ID: a7c35e8d1f92
+Revises: e61f0a9d27c4
+Create Date: 2026-10-17 14:05:37.214806
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c35e8d1f92'
+down_revision = 'e61f0a9d27c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # integer equality inside a GiST index needs btree_gist
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.create_table('artist_availability',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('during', postgresql.TSTZRANGE(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artists.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_artist_availability_artist_id_during', 'artist_availability',
+                    ['artist_id', 'during'], postgresql_using='gist')
+
+
+def downgrade():
+    op.drop_index('ix_artist_availability_artist_id_during', table_name='artist_availability')
+    op.drop_table('artist_availability')
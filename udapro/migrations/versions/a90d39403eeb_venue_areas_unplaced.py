@@ -0,0 +1,263 @@
+"""venue_areas keeps venues without a city or state in blank areas
+
+Revision ID: a90d39403eeb
+Revises: e1f7a9c35d20
+Create Date: 2026-10-19 09:41:27.530614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a90d39403eeb'
+down_revision = 'e1f7a9c35d20'
+branch_labels = None
+depends_on = None
+
+
+def blank(column):
+    # a missing city or state is the empty string in venue_areas, so such
+    # venues are listed in an area of their own, as /venues did before the
+    # rollup
+    return "coalesce({}::text, '')".format(column)
+
+
+def as_text(column):
+    return '{}::text'.format(column)
+
+
+def venues_changed(area):
+    return """
+        CREATE OR REPLACE FUNCTION venue_areas_venues_changed() RETURNS trigger AS $$
+        DECLARE
+          states text[];
+          cities text[];
+          changed_venues integer[];
+          venue_deltas integer[];
+          show_deltas integer[];
+        BEGIN
+          IF current_setting('venue_areas.deferred', true) = 'on' THEN
+            RETURN NULL;
+          END IF;
+
+          IF TG_OP = 'INSERT' THEN
+            SELECT array_agg({new_state}), array_agg({new_city}), array_agg(id), array_agg(1), array_agg(upcoming.shows)
+            INTO states, cities, changed_venues, venue_deltas, show_deltas
+            FROM new_rows
+            CROSS JOIN LATERAL (
+              SELECT count(*)::integer AS shows FROM shows
+              WHERE shows.venue_id = new_rows.id AND shows.start_time > localtimestamp
+            ) upcoming;
+          ELSIF TG_OP = 'DELETE' THEN
+            -- their shows were deleted by the cascade before this runs,
+            -- and found no venue to count against; the emptied areas'
+            -- upcoming counts are taken again below
+            SELECT array_agg({old_state}), array_agg({old_city}), array_agg(id), array_agg(-1), array_agg(0)
+            INTO states, cities, changed_venues, venue_deltas, show_deltas
+            FROM old_rows;
+          ELSE
+            -- only venues that moved; they leave their old area with their
+            -- upcoming shows and join the new one
+            SELECT array_agg(area.state), array_agg(area.city), array_agg(area.venue_id),
+                   array_agg(area.venue_delta), array_agg(area.show_delta)
+            INTO states, cities, changed_venues, venue_deltas, show_deltas
+            FROM old_rows JOIN new_rows USING (id)
+            CROSS JOIN LATERAL (
+              SELECT count(*)::integer AS shows FROM shows
+              WHERE shows.venue_id = new_rows.id AND shows.start_time > localtimestamp
+            ) upcoming
+            CROSS JOIN LATERAL (VALUES
+              ({old_rows_state}, {old_rows_city}, old_rows.id, -1, -upcoming.shows),
+              ({new_rows_state}, {new_rows_city}, new_rows.id, 1, upcoming.shows)
+            ) area(state, city, venue_id, venue_delta, show_delta)
+            WHERE (old_rows.state, old_rows.city) IS DISTINCT FROM (new_rows.state, new_rows.city);
+          END IF;
+
+          IF states IS NOT NULL THEN
+            PERFORM adjust_venue_areas(states, cities, changed_venues, venue_deltas, show_deltas);
+          END IF;
+
+          IF TG_OP = 'DELETE' AND states IS NOT NULL THEN
+            UPDATE venue_areas SET upcoming_show_count = (
+              SELECT count(*) FROM shows
+              WHERE shows.venue_id = ANY(venue_areas.venue_ids) AND shows.start_time > localtimestamp
+            )
+            WHERE (venue_areas.state, venue_areas.city) IN (SELECT * FROM unnest(states, cities));
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """.format(
+        new_state=area('state'), new_city=area('city'),
+        old_state=area('state'), old_city=area('city'),
+        old_rows_state=area('old_rows.state'), old_rows_city=area('old_rows.city'),
+        new_rows_state=area('new_rows.state'), new_rows_city=area('new_rows.city'),
+    )
+
+
+def shows_changed(area):
+    changed = """
+            SELECT array_agg({state}), array_agg({city}), array_agg(venues.id), array_agg({shows})
+            INTO states, cities, changed_venues, show_deltas"""
+    return """
+        CREATE OR REPLACE FUNCTION venue_areas_shows_changed() RETURNS trigger AS $$
+        DECLARE
+          states text[];
+          cities text[];
+          changed_venues integer[];
+          show_deltas integer[];
+        BEGIN
+          IF current_setting('venue_areas.deferred', true) = 'on' THEN
+            RETURN NULL;
+          END IF;
+
+          -- past shows are not counted, so only upcoming ones matter; shows
+          -- deleted along with their venue find no venue here, see above
+          IF TG_OP = 'INSERT' THEN{insert}
+            FROM (
+              SELECT venue_id, count(*)::integer AS shows FROM new_rows
+              WHERE start_time > localtimestamp GROUP BY venue_id
+            ) changed
+            JOIN venues ON venues.id = changed.venue_id;
+          ELSIF TG_OP = 'DELETE' THEN{delete}
+            FROM (
+              SELECT venue_id, count(*)::integer AS shows FROM old_rows
+              WHERE start_time > localtimestamp GROUP BY venue_id
+            ) changed
+            JOIN venues ON venues.id = changed.venue_id;
+          ELSE{update}
+            FROM (
+              SELECT venue_id, sum(shows)::integer AS shows FROM (
+                SELECT venue_id, -1 AS shows FROM old_rows WHERE start_time > localtimestamp
+                UNION ALL
+                SELECT venue_id, 1 FROM new_rows WHERE start_time > localtimestamp
+              ) moved
+              GROUP BY venue_id HAVING sum(shows) <> 0
+            ) changed
+            JOIN venues ON venues.id = changed.venue_id;
+          END IF;
+
+          IF states IS NOT NULL THEN
+            PERFORM adjust_venue_areas(states, cities, changed_venues, array_fill(0, ARRAY[cardinality(changed_venues)]), show_deltas);
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """.format(
+        insert=changed.format(state=area('venues.state'), city=area('venues.city'), shows='changed.shows'),
+        delete=changed.format(state=area('venues.state'), city=area('venues.city'), shows='-changed.shows'),
+        update=changed.format(state=area('venues.state'), city=area('venues.city'), shows='changed.shows'),
+    )
+
+
+def upgrade():
+    # areas given as NULL are the blank area; venues are found through the
+    # (state, city) index as before, and only a blank area also looks for
+    # venues whose city or state is NULL
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_venue_areas(states text[], cities text[]) RETURNS integer AS $$
+          WITH areas AS (
+            SELECT DISTINCT coalesce(state, '') AS state, coalesce(city, '') AS city
+            FROM unnest(states, cities) AS area(state, city)
+          ), fresh AS (
+            SELECT
+              areas.state,
+              areas.city,
+              count(placed.id) AS venue_count,
+              coalesce(sum(upcoming.shows), 0) AS upcoming_show_count,
+              coalesce(array_agg(placed.id ORDER BY placed.id) FILTER (WHERE placed.id IS NOT NULL), '{}') AS venue_ids
+            FROM areas
+            LEFT JOIN LATERAL (
+              SELECT venues.id FROM venues
+              WHERE venues.state = areas.state AND venues.city = areas.city
+              UNION ALL
+              SELECT venues.id FROM venues
+              WHERE (areas.state = '' OR areas.city = '')
+                AND (venues.state IS NULL OR venues.city IS NULL)
+                AND coalesce(venues.state, '') = areas.state AND coalesce(venues.city, '') = areas.city
+            ) placed ON true
+            LEFT JOIN LATERAL (
+              SELECT count(*) AS shows FROM shows
+              WHERE shows.venue_id = placed.id AND shows.start_time > localtimestamp
+            ) upcoming ON true
+            GROUP BY areas.state, areas.city
+          ), upserted AS (
+            INSERT INTO venue_areas (state, city, venue_count, upcoming_show_count, venue_ids)
+            SELECT state, city, venue_count, upcoming_show_count, venue_ids FROM fresh
+            WHERE venue_count > 0
+            ON CONFLICT (state, city) DO UPDATE SET
+              venue_count = excluded.venue_count,
+              upcoming_show_count = excluded.upcoming_show_count,
+              venue_ids = excluded.venue_ids
+            WHERE (venue_areas.venue_count, venue_areas.upcoming_show_count, venue_areas.venue_ids)
+              IS DISTINCT FROM (excluded.venue_count, excluded.upcoming_show_count, excluded.venue_ids)
+            RETURNING 1
+          ), removed AS (
+            DELETE FROM venue_areas
+            WHERE (state, city) IN (SELECT state, city FROM fresh WHERE venue_count = 0)
+            RETURNING 1
+          )
+          SELECT ((SELECT count(*) FROM upserted) + (SELECT count(*) FROM removed))::integer
+        $$ LANGUAGE sql
+    """)
+    op.execute(venues_changed(blank))
+    op.execute(shows_changed(blank))
+
+    op.execute("""
+        SELECT refresh_venue_areas(array_agg(state::text), array_agg(city::text))
+        FROM (SELECT DISTINCT state, city FROM venues WHERE state IS NULL OR city IS NULL) areas
+    """)
+
+
+def downgrade():
+    # the functions of f3a61c9e4b27 and e1f7a9c35d20, which leave venues
+    # without a city or state out; the blank areas go, and those of venues
+    # whose city or state is the empty string are built again
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_venue_areas(states text[], cities text[]) RETURNS integer AS $$
+          WITH areas AS (
+            SELECT DISTINCT state, city
+            FROM unnest(states, cities) AS area(state, city)
+            WHERE state IS NOT NULL AND city IS NOT NULL
+          ), fresh AS (
+            SELECT
+              areas.state,
+              areas.city,
+              count(venues.id) AS venue_count,
+              coalesce(sum(upcoming.shows), 0) AS upcoming_show_count,
+              coalesce(array_agg(venues.id ORDER BY venues.id) FILTER (WHERE venues.id IS NOT NULL), '{}') AS venue_ids
+            FROM areas
+            LEFT JOIN venues ON venues.state = areas.state AND venues.city = areas.city
+            LEFT JOIN LATERAL (
+              SELECT count(*) AS shows FROM shows
+              WHERE shows.venue_id = venues.id AND shows.start_time > localtimestamp
+            ) upcoming ON true
+            GROUP BY areas.state, areas.city
+          ), upserted AS (
+            INSERT INTO venue_areas (state, city, venue_count, upcoming_show_count, venue_ids)
+            SELECT state, city, venue_count, upcoming_show_count, venue_ids FROM fresh
+            WHERE venue_count > 0
+            ON CONFLICT (state, city) DO UPDATE SET
+              venue_count = excluded.venue_count,
+              upcoming_show_count = excluded.upcoming_show_count,
+              venue_ids = excluded.venue_ids
+            WHERE (venue_areas.venue_count, venue_areas.upcoming_show_count, venue_areas.venue_ids)
+              IS DISTINCT FROM (excluded.venue_count, excluded.upcoming_show_count, excluded.venue_ids)
+            RETURNING 1
+          ), removed AS (
+            DELETE FROM venue_areas
+            WHERE (state, city) IN (SELECT state, city FROM fresh WHERE venue_count = 0)
+            RETURNING 1
+          )
+          SELECT ((SELECT count(*) FROM upserted) + (SELECT count(*) FROM removed))::integer
+        $$ LANGUAGE sql
+    """)
+    op.execute(venues_changed(as_text))
+    op.execute(shows_changed(as_text))
+
+    op.execute("DELETE FROM venue_areas WHERE state = '' OR city = ''")
+    op.execute("""
+        SELECT refresh_venue_areas(array_agg(state::text), array_agg(city::text))
+        FROM (SELECT DISTINCT state, city FROM venues WHERE state = '' OR city = '') areas
+    """)
@@ -0,0 +1,72 @@
+"""venue and artist created_at
+
+Revision ID: b58e2d7c1a94
+Revises: f3a61c9e4b27
+Create Date: 2026-10-17 19:55:31.402817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e2d7c1a94'
+down_revision = 'f3a61c9e4b27'
+branch_labels = None
+depends_on = None
+
+# rows backfilled per transaction
+BATCH_SIZE = 10000
+
+
+def upgrade():
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('created_at', sa.DateTime(), nullable=True))
+
+    # ids are handed out in listing order, so a row was listed no later
+    # than any row after it was last written: its created_at is the
+    # earliest updated_at at or above its id. Rows never edited keep their
+    # own time. Batches go from the top id down, carrying that minimum,
+    # and each is committed on its own
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        for table in ('venues', 'artists'):
+            last = bind.execute(sa.text('SELECT coalesce(max(id), 0) FROM {}'.format(table))).scalar()
+            carry = None
+            for first in range(last - last % BATCH_SIZE, -1, -BATCH_SIZE):
+                carry = bind.execute(sa.text("""
+                    WITH batch AS (
+                      SELECT id, least(
+                        min(updated_at) OVER (ORDER BY id DESC),
+                        CAST(:carry AS timestamp)
+                      ) AS created_at
+                      FROM {0}
+                      WHERE id >= :first AND id < :next
+                    ), backfilled AS (
+                      UPDATE {0} SET created_at = batch.created_at
+                      FROM batch
+                      WHERE batch.id = {0}.id
+                      RETURNING batch.created_at
+                    )
+                    SELECT min(created_at) FROM backfilled
+                """.format(table)), {'carry': carry, 'first': first, 'next': first + BATCH_SIZE}).scalar() or carry
+
+    for table in ('venues', 'artists'):
+        op.alter_column(table, 'created_at', nullable=False,
+                        server_default=sa.text("timezone('utc', now())"))
+
+    # the home page's newest listings are the first rows of these
+    with op.get_context().autocommit_block():
+        for table in ('venues', 'artists'):
+            op.create_index('ix_{}_created_at_id'.format(table), table,
+                            [sa.text('created_at DESC'), sa.text('id DESC')],
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in ('artists', 'venues'):
+            op.drop_index('ix_{}_created_at_id'.format(table), table_name=table,
+                          postgresql_concurrently=True)
+    for table in ('artists', 'venues'):
+        op.drop_column(table, 'created_at')
@@ -0,0 +1,71 @@
+"""search vectors and trigram indexes
+
+Revision ID: c4d9a2e61b3f
+Revises: 8f2b6c1d4e7a
+Create Date: 2026-10-17 10:02:41.507713
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9a2e61b3f'
+down_revision = '8f2b6c1d4e7a'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION search_vector_update() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER {table}_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+FOR EACH ROW EXECUTE PROCEDURE search_vector_update()
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(SEARCH_VECTOR_FUNCTION)
+
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(SEARCH_VECTOR_TRIGGER.format(table=table))
+        # the trigger fills in the vector for every touched row
+        op.execute('UPDATE {table} SET name = name'.format(table=table))
+
+    with op.get_context().autocommit_block():
+        for table in ('venues', 'artists'):
+            op.create_index('ix_{}_search_vector'.format(table), table,
+                            ['search_vector'], postgresql_using='gin',
+                            postgresql_concurrently=True)
+            op.create_index('ix_{}_name_trgm'.format(table), table, ['name'],
+                            postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'},
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in ('venues', 'artists'):
+            op.drop_index('ix_{}_name_trgm'.format(table), table_name=table,
+                          postgresql_concurrently=True)
+            op.drop_index('ix_{}_search_vector'.format(table), table_name=table,
+                          postgresql_concurrently=True)
+
+    for table in ('venues', 'artists'):
+        op.execute('DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}'.format(table=table))
+        op.drop_column(table, 'search_vector')
+    op.execute('DROP FUNCTION IF EXISTS search_vector_update()')
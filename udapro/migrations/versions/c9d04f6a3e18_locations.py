@@ -0,0 +1,138 @@
+"""normalized locations for venues and artists
+
+Revision ID: c9d04f6a3e18
+Revises: b58e2d7c1a94
+Create Date: 2026-10-17 21:08:44.730156
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9d04f6a3e18'
+down_revision = 'b58e2d7c1a94'
+branch_labels = None
+depends_on = None
+
+# rows relinked per transaction
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    # "San Francisco", " san  francisco" and "SAN FRANCISCO" share a key
+    op.execute("""
+        CREATE FUNCTION location_key(city text) RETURNS text AS $$
+          SELECT lower(regexp_replace(btrim(city), '\\s+', ' ', 'g'))
+        $$ LANGUAGE sql IMMUTABLE
+    """)
+
+    op.create_table(
+        'locations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('city_key', sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('state', 'city_key', name='uq_locations_state_city_key')
+    )
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('location_id', sa.Integer(), nullable=True))
+        op.create_foreign_key('fk_{}_location_id'.format(table), table, 'locations', ['location_id'], ['id'])
+
+    # one location per key, spelled the way most rows spell it
+    op.execute("""
+        INSERT INTO locations (city, state, city_key)
+        SELECT DISTINCT ON (state, city_key) city, state, city_key
+        FROM (
+          SELECT
+            regexp_replace(btrim(city), '\\s+', ' ', 'g') AS city,
+            upper(btrim(state)) AS state,
+            location_key(city) AS city_key,
+            count(*) AS uses
+          FROM (SELECT city, state FROM venues UNION ALL SELECT city, state FROM artists) listed
+          WHERE location_key(city) <> '' AND btrim(state) <> ''
+          GROUP BY 1, 2, 3
+        ) spellings
+        ORDER BY state, city_key, uses DESC, city
+    """)
+
+    # every write of city or state links the row to its location, adding
+    # one if need be, and stores the location's spelling, so listings
+    # and the venue_areas rollup group the same place together however
+    # it was typed
+    op.execute("""
+        CREATE FUNCTION set_location() RETURNS trigger AS $$
+        DECLARE
+          location locations%ROWTYPE;
+        BEGIN
+          IF coalesce(location_key(NEW.city), '') = '' OR coalesce(btrim(NEW.state), '') = '' THEN
+            NEW.location_id := NULL;
+            RETURN NEW;
+          END IF;
+
+          SELECT * INTO location FROM locations
+          WHERE state = upper(btrim(NEW.state)) AND city_key = location_key(NEW.city);
+          IF NOT FOUND THEN
+            INSERT INTO locations (city, state, city_key)
+            VALUES (regexp_replace(btrim(NEW.city), '\\s+', ' ', 'g'), upper(btrim(NEW.state)), location_key(NEW.city))
+            ON CONFLICT (state, city_key) DO NOTHING;
+            SELECT * INTO location FROM locations
+            WHERE state = upper(btrim(NEW.state)) AND city_key = location_key(NEW.city);
+          END IF;
+
+          NEW.location_id := location.id;
+          NEW.city := location.city;
+          NEW.state := location.state;
+          RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ('venues', 'artists'):
+        op.execute("""
+            CREATE TRIGGER {0}_location BEFORE INSERT OR UPDATE OF city, state ON {0}
+            FOR EACH ROW EXECUTE PROCEDURE set_location()
+        """.format(table))
+
+    # existing rows are relinked by rewriting their city through the
+    # trigger, in id ranges each committed on its own; venues that change
+    # spelling move to the deduplicated area in venue_areas as they go.
+    # Rows whose spelling changes get a new version, like any other write,
+    # so their pages' ETags and cached fragments move. Later writes go
+    # through the ORM or the importer, which bump it themselves
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        for table in ('venues', 'artists'):
+            last = bind.execute(sa.text('SELECT coalesce(max(id), 0) FROM {}'.format(table))).scalar()
+            for first in range(0, last + 1, BATCH_SIZE):
+                bind.execute(sa.text("""
+                    UPDATE {0} SET city = {0}.city, version = {0}.version + 1
+                    FROM locations
+                    WHERE {0}.id >= :first AND {0}.id < :next AND {0}.location_id IS NULL
+                      AND locations.state = upper(btrim({0}.state))
+                      AND locations.city_key = location_key({0}.city)
+                      AND ({0}.city, {0}.state) IS DISTINCT FROM (locations.city, locations.state)
+                """.format(table)), {'first': first, 'next': first + BATCH_SIZE})
+                bind.execute(sa.text("""
+                    UPDATE {} SET city = city
+                    WHERE id >= :first AND id < :next AND location_id IS NULL
+                """.format(table)), {'first': first, 'next': first + BATCH_SIZE})
+
+        for table in ('venues', 'artists'):
+            op.create_index('ix_{}_location_id_id'.format(table), table,
+                            ['location_id', 'id'],
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in ('artists', 'venues'):
+            op.drop_index('ix_{}_location_id_id'.format(table), table_name=table,
+                          postgresql_concurrently=True)
+    for table in ('artists', 'venues'):
+        op.execute('DROP TRIGGER {0}_location ON {0}'.format(table))
+        op.drop_constraint('fk_{}_location_id'.format(table), table, type_='foreignkey')
+        op.drop_column(table, 'location_id')
+    op.execute('DROP FUNCTION set_location()')
+    op.drop_table('locations')
+    op.execute('DROP FUNCTION location_key(text)')
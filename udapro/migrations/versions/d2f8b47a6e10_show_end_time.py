@@ -0,0 +1,88 @@
+"""show end_time and venue double-booking exclusion
+
+Revision ID: d2f8b47a6e10
+Revises: a7c35e8d1f92
+Create Date: 2026-10-17 15:22:09.538170
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f8b47a6e10'
+down_revision = 'a7c35e8d1f92'
+branch_labels = None
+depends_on = None
+
+# venues whose shows are backfilled per transaction
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # two shows at one venue and start_time could only be given an empty
+    # range each. Repeats of a show, the same artist again, are deleted
+    # keeping the first; shows left sharing a slot are double bookings only
+    # a person can settle, and stop the upgrade before anything changes
+    op.execute("""
+        DELETE FROM shows USING shows first
+        WHERE first.venue_id = shows.venue_id AND first.start_time = shows.start_time
+          AND first.artist_id = shows.artist_id AND first.id < shows.id
+    """)
+    clashes = bind.execute(sa.text("""
+        SELECT venue_id, start_time, array_agg(id ORDER BY id) AS ids FROM shows
+        GROUP BY venue_id, start_time HAVING count(*) > 1
+        ORDER BY venue_id, start_time
+    """)).fetchall()
+    if clashes:
+        raise RuntimeError(
+            'Shows booked at the same venue and start time: {}. Move or delete all but one '
+            'show of each, then run the upgrade again.'.format(
+                '; '.join('venue {} at {}: shows {}'.format(
+                    clash.venue_id, clash.start_time, ', '.join(map(str, clash.ids))) for clash in clashes)
+            )
+        )
+
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    # existing shows get the default two hours, cut short where the venue's
+    # next show starts sooner so that the exclusion constraint can be
+    # added; with no two left starting together, every range is non-empty.
+    # Venues are backfilled in batches, each committed on its own, so no
+    # single transaction holds locks on the whole table
+    with op.get_context().autocommit_block():
+        last = bind.execute(sa.text('SELECT coalesce(max(id), 0) FROM venues')).scalar()
+        for first in range(0, last + 1, BATCH_SIZE):
+            bind.execute(sa.text("""
+                UPDATE shows SET end_time = least(
+                  shows.start_time + interval '2 hours',
+                  coalesce(next.start_time, 'infinity')
+                )
+                FROM (
+                  SELECT id, lead(start_time) OVER (
+                    PARTITION BY venue_id ORDER BY start_time, id
+                  ) AS start_time
+                  FROM shows
+                  WHERE venue_id >= :first AND venue_id < :next
+                ) next
+                WHERE next.id = shows.id AND shows.end_time IS NULL
+            """), {'first': first, 'next': first + BATCH_SIZE})
+
+    op.alter_column('shows', 'end_time', nullable=False)
+    # an empty range overlaps nothing, so the exclusion alone would let
+    # zero-length shows stack up at one time
+    op.create_check_constraint('ck_shows_end_time_after_start_time', 'shows', 'end_time > start_time')
+    # the constraint's GiST index also serves venue time range lookups;
+    # btree_gist was enabled for artist availability
+    op.execute(
+        'ALTER TABLE shows ADD CONSTRAINT ex_shows_venue_id_during '
+        'EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)'
+    )
+
+
+def downgrade():
+    op.drop_constraint('ex_shows_venue_id_during', 'shows')
+    op.drop_constraint('ck_shows_end_time_after_start_time', 'shows')
+    op.drop_column('shows', 'end_time')
@@ -0,0 +1,255 @@
+"""venue_areas triggers apply deltas instead of recomputing areas
+
+Revision ID: e1f7a9c35d20
+Revises: c9d04f6a3e18
+Create Date: 2026-10-18 10:12:06.381945
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f7a9c35d20'
+down_revision = 'c9d04f6a3e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # one element per (area, venue) change: the venue joins (+1), leaves
+    # (-1) or stays in (0) the area, and its upcoming shows there change
+    # by show_deltas. Counts are added to the row as it is when locked, and
+    # venue ids added to or removed from its own array, so concurrent
+    # writers to one area queue on its row for a single UPDATE instead of
+    # overwriting each other's snapshot of it
+    op.execute("""
+        CREATE FUNCTION adjust_venue_areas(
+          states text[], cities text[], changed_venues integer[], venue_deltas integer[], show_deltas integer[]
+        ) RETURNS void AS $$
+        BEGIN
+          INSERT INTO venue_areas (state, city, venue_count, upcoming_show_count, venue_ids)
+          SELECT DISTINCT change.state, change.city, 0, 0, '{}'::integer[]
+          FROM unnest(states, cities, venue_deltas) AS change(state, city, venue_delta)
+          WHERE change.venue_delta > 0 AND change.state IS NOT NULL AND change.city IS NOT NULL
+          ON CONFLICT (state, city) DO NOTHING;
+
+          -- areas are locked in one order, so statements touching several
+          -- of them wait for each other rather than deadlock
+          PERFORM 1 FROM venue_areas
+          WHERE (venue_areas.state, venue_areas.city) IN (SELECT * FROM unnest(states, cities))
+          ORDER BY venue_areas.state, venue_areas.city
+          FOR UPDATE;
+
+          UPDATE venue_areas SET
+            venue_count = venue_areas.venue_count + delta.venue_count,
+            upcoming_show_count = venue_areas.upcoming_show_count + delta.upcoming_show_count,
+            venue_ids = CASE
+              WHEN cardinality(delta.added) + cardinality(delta.removed) = 0 THEN venue_areas.venue_ids
+              ELSE ARRAY(
+                SELECT venue.id FROM unnest(venue_areas.venue_ids || delta.added) AS venue(id)
+                WHERE venue.id <> ALL(delta.removed)
+                ORDER BY venue.id
+              )
+            END
+          FROM (
+            SELECT
+              change.state,
+              change.city,
+              sum(change.venue_delta)::integer AS venue_count,
+              sum(change.show_delta)::integer AS upcoming_show_count,
+              coalesce(array_agg(change.venue_id) FILTER (WHERE change.venue_delta > 0), '{}') AS added,
+              coalesce(array_agg(change.venue_id) FILTER (WHERE change.venue_delta < 0), '{}') AS removed
+            FROM unnest(states, cities, changed_venues, venue_deltas, show_deltas)
+              AS change(state, city, venue_id, venue_delta, show_delta)
+            GROUP BY change.state, change.city
+          ) delta
+          WHERE venue_areas.state = delta.state AND venue_areas.city = delta.city
+            AND (delta.venue_count <> 0 OR delta.upcoming_show_count <> 0
+                 OR cardinality(delta.added) + cardinality(delta.removed) > 0);
+
+          DELETE FROM venue_areas
+          WHERE venue_areas.venue_count <= 0
+            AND (venue_areas.state, venue_areas.city) IN (SELECT * FROM unnest(states, cities));
+        END
+        $$ LANGUAGE plpgsql
+    """)
+
+    # bulk loads set venue_areas.deferred to skip the triggers and refresh
+    # the areas they touched once at the end
+    op.execute("""
+        CREATE OR REPLACE FUNCTION venue_areas_venues_changed() RETURNS trigger AS $$
+        DECLARE
+          states text[];
+          cities text[];
+          changed_venues integer[];
+          venue_deltas integer[];
+          show_deltas integer[];
+        BEGIN
+          IF current_setting('venue_areas.deferred', true) = 'on' THEN
+            RETURN NULL;
+          END IF;
+
+          IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(state::text), array_agg(city::text), array_agg(id), array_agg(1), array_agg(upcoming.shows)
+            INTO states, cities, changed_venues, venue_deltas, show_deltas
+            FROM new_rows
+            CROSS JOIN LATERAL (
+              SELECT count(*)::integer AS shows FROM shows
+              WHERE shows.venue_id = new_rows.id AND shows.start_time > localtimestamp
+            ) upcoming;
+          ELSIF TG_OP = 'DELETE' THEN
+            -- their shows were deleted by the cascade before this runs,
+            -- and found no venue to count against; the emptied areas'
+            -- upcoming counts are taken again below
+            SELECT array_agg(state::text), array_agg(city::text), array_agg(id), array_agg(-1), array_agg(0)
+            INTO states, cities, changed_venues, venue_deltas, show_deltas
+            FROM old_rows;
+          ELSE
+            -- only venues that moved; they leave their old area with their
+            -- upcoming shows and join the new one
+            SELECT array_agg(area.state), array_agg(area.city), array_agg(area.venue_id),
+                   array_agg(area.venue_delta), array_agg(area.show_delta)
+            INTO states, cities, changed_venues, venue_deltas, show_deltas
+            FROM old_rows JOIN new_rows USING (id)
+            CROSS JOIN LATERAL (
+              SELECT count(*)::integer AS shows FROM shows
+              WHERE shows.venue_id = new_rows.id AND shows.start_time > localtimestamp
+            ) upcoming
+            CROSS JOIN LATERAL (VALUES
+              (old_rows.state::text, old_rows.city::text, old_rows.id, -1, -upcoming.shows),
+              (new_rows.state::text, new_rows.city::text, new_rows.id, 1, upcoming.shows)
+            ) area(state, city, venue_id, venue_delta, show_delta)
+            WHERE (old_rows.state, old_rows.city) IS DISTINCT FROM (new_rows.state, new_rows.city);
+          END IF;
+
+          IF states IS NOT NULL THEN
+            PERFORM adjust_venue_areas(states, cities, changed_venues, venue_deltas, show_deltas);
+          END IF;
+
+          IF TG_OP = 'DELETE' AND states IS NOT NULL THEN
+            UPDATE venue_areas SET upcoming_show_count = (
+              SELECT count(*) FROM shows
+              WHERE shows.venue_id = ANY(venue_areas.venue_ids) AND shows.start_time > localtimestamp
+            )
+            WHERE (venue_areas.state, venue_areas.city) IN (SELECT * FROM unnest(states, cities));
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION venue_areas_shows_changed() RETURNS trigger AS $$
+        DECLARE
+          states text[];
+          cities text[];
+          changed_venues integer[];
+          show_deltas integer[];
+        BEGIN
+          IF current_setting('venue_areas.deferred', true) = 'on' THEN
+            RETURN NULL;
+          END IF;
+
+          -- past shows are not counted, so only upcoming ones matter; shows
+          -- deleted along with their venue find no venue here, see above
+          IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(venues.state::text), array_agg(venues.city::text), array_agg(venues.id), array_agg(changed.shows)
+            INTO states, cities, changed_venues, show_deltas
+            FROM (
+              SELECT venue_id, count(*)::integer AS shows FROM new_rows
+              WHERE start_time > localtimestamp GROUP BY venue_id
+            ) changed
+            JOIN venues ON venues.id = changed.venue_id;
+          ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(venues.state::text), array_agg(venues.city::text), array_agg(venues.id), array_agg(-changed.shows)
+            INTO states, cities, changed_venues, show_deltas
+            FROM (
+              SELECT venue_id, count(*)::integer AS shows FROM old_rows
+              WHERE start_time > localtimestamp GROUP BY venue_id
+            ) changed
+            JOIN venues ON venues.id = changed.venue_id;
+          ELSE
+            SELECT array_agg(venues.state::text), array_agg(venues.city::text), array_agg(venues.id), array_agg(changed.shows)
+            INTO states, cities, changed_venues, show_deltas
+            FROM (
+              SELECT venue_id, sum(shows)::integer AS shows FROM (
+                SELECT venue_id, -1 AS shows FROM old_rows WHERE start_time > localtimestamp
+                UNION ALL
+                SELECT venue_id, 1 FROM new_rows WHERE start_time > localtimestamp
+              ) moved
+              GROUP BY venue_id HAVING sum(shows) <> 0
+            ) changed
+            JOIN venues ON venues.id = changed.venue_id;
+          END IF;
+
+          IF states IS NOT NULL THEN
+            PERFORM adjust_venue_areas(states, cities, changed_venues, array_fill(0, ARRAY[cardinality(changed_venues)]), show_deltas);
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def downgrade():
+    # the recomputing trigger functions of f3a61c9e4b27
+    op.execute("""
+        CREATE OR REPLACE FUNCTION venue_areas_venues_changed() RETURNS trigger AS $$
+        DECLARE
+          states text[];
+          cities text[];
+        BEGIN
+          IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(state::text), array_agg(city::text) INTO states, cities FROM new_rows;
+          ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(state::text), array_agg(city::text) INTO states, cities FROM old_rows;
+          ELSE
+            SELECT array_agg(area.state), array_agg(area.city) INTO states, cities
+            FROM old_rows JOIN new_rows USING (id)
+            CROSS JOIN LATERAL (VALUES
+              (old_rows.state::text, old_rows.city::text),
+              (new_rows.state::text, new_rows.city::text)
+            ) area(state, city)
+            WHERE (old_rows.state, old_rows.city) IS DISTINCT FROM (new_rows.state, new_rows.city);
+          END IF;
+
+          IF states IS NOT NULL THEN
+            PERFORM refresh_venue_areas(states, cities);
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION venue_areas_shows_changed() RETURNS trigger AS $$
+        DECLARE
+          changed_venues integer[];
+          states text[];
+          cities text[];
+        BEGIN
+          IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT venue_id) INTO changed_venues FROM new_rows
+            WHERE start_time > localtimestamp;
+          ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT venue_id) INTO changed_venues FROM old_rows
+            WHERE start_time > localtimestamp;
+          ELSE
+            SELECT array_agg(DISTINCT changed.venue_id) INTO changed_venues
+            FROM old_rows JOIN new_rows USING (id)
+            CROSS JOIN LATERAL (VALUES (old_rows.venue_id), (new_rows.venue_id)) changed(venue_id)
+            WHERE (old_rows.venue_id, old_rows.start_time) IS DISTINCT FROM (new_rows.venue_id, new_rows.start_time)
+              AND (old_rows.start_time > localtimestamp OR new_rows.start_time > localtimestamp);
+          END IF;
+
+          IF changed_venues IS NOT NULL THEN
+            SELECT array_agg(state::text), array_agg(city::text) INTO states, cities
+            FROM venues WHERE id = ANY(changed_venues);
+            IF states IS NOT NULL THEN
+              PERFORM refresh_venue_areas(states, cities);
+            END IF;
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute('DROP FUNCTION adjust_venue_areas(text[], text[], integer[], integer[], integer[])')
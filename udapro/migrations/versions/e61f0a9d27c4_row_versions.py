@@ -0,0 +1,32 @@
+"""row versions and updated_at
+
+Revision ID: e61f0a9d27c4
+Revises: 3b7e90c2f5a1
+Create Date: 2026-10-17 12:40:18.665020
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61f0a9d27c4'
+down_revision = '3b7e90c2f5a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # neither default is volatile, so Postgres adds both columns without
+    # rewriting the tables
+    for table in ('venues', 'artists', 'shows'):
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       server_default=sa.text("timezone('utc', now())"),
+                                       nullable=False))
+
+
+def downgrade():
+    for table in ('shows', 'artists', 'venues'):
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'version')
@@ -0,0 +1,175 @@
+"""venue_areas rollup of venues by city and state
+
+Revision ID: f3a61c9e4b27
+Revises: d2f8b47a6e10
+Create Date: 2026-10-17 18:40:52.116204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a61c9e4b27'
+down_revision = 'd2f8b47a6e10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'venue_areas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('venue_count', sa.Integer(), nullable=False),
+        sa.Column('upcoming_show_count', sa.Integer(), nullable=False),
+        sa.Column('venue_ids', sa.ARRAY(sa.Integer()), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('state', 'city', name='uq_venue_areas_state_city')
+    )
+    op.create_index('ix_venue_areas_state_city_id', 'venue_areas', ['state', 'city', 'id'])
+
+    # recomputes the given areas from venues and shows, keeping each
+    # area's id (the /venues page cursor) and dropping emptied ones;
+    # returns how many rows it changed. Venues without a city or state
+    # are not in any area. Two transactions writing to one area at once
+    # can leave it slightly off, and upcoming counts drift as shows pass;
+    # `flask refresh-venue-areas` recomputes every area to fix both
+    op.execute("""
+        CREATE FUNCTION refresh_venue_areas(states text[], cities text[]) RETURNS integer AS $$
+          WITH areas AS (
+            SELECT DISTINCT state, city
+            FROM unnest(states, cities) AS area(state, city)
+            WHERE state IS NOT NULL AND city IS NOT NULL
+          ), fresh AS (
+            SELECT
+              areas.state,
+              areas.city,
+              count(venues.id) AS venue_count,
+              coalesce(sum(upcoming.shows), 0) AS upcoming_show_count,
+              coalesce(array_agg(venues.id ORDER BY venues.id) FILTER (WHERE venues.id IS NOT NULL), '{}') AS venue_ids
+            FROM areas
+            LEFT JOIN venues ON venues.state = areas.state AND venues.city = areas.city
+            LEFT JOIN LATERAL (
+              SELECT count(*) AS shows FROM shows
+              WHERE shows.venue_id = venues.id AND shows.start_time > localtimestamp
+            ) upcoming ON true
+            GROUP BY areas.state, areas.city
+          ), upserted AS (
+            INSERT INTO venue_areas (state, city, venue_count, upcoming_show_count, venue_ids)
+            SELECT state, city, venue_count, upcoming_show_count, venue_ids FROM fresh
+            WHERE venue_count > 0
+            ON CONFLICT (state, city) DO UPDATE SET
+              venue_count = excluded.venue_count,
+              upcoming_show_count = excluded.upcoming_show_count,
+              venue_ids = excluded.venue_ids
+            WHERE (venue_areas.venue_count, venue_areas.upcoming_show_count, venue_areas.venue_ids)
+              IS DISTINCT FROM (excluded.venue_count, excluded.upcoming_show_count, excluded.venue_ids)
+            RETURNING 1
+          ), removed AS (
+            DELETE FROM venue_areas
+            WHERE (state, city) IN (SELECT state, city FROM fresh WHERE venue_count = 0)
+            RETURNING 1
+          )
+          SELECT ((SELECT count(*) FROM upserted) + (SELECT count(*) FROM removed))::integer
+        $$ LANGUAGE sql
+    """)
+
+    # statement level triggers, so a COPY or a multi-row INSERT recomputes
+    # each area it touches once; transition tables allow one event per
+    # trigger, hence one trigger per operation sharing a function
+    op.execute("""
+        CREATE FUNCTION venue_areas_venues_changed() RETURNS trigger AS $$
+        DECLARE
+          states text[];
+          cities text[];
+        BEGIN
+          IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(state::text), array_agg(city::text) INTO states, cities FROM new_rows;
+          ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(state::text), array_agg(city::text) INTO states, cities FROM old_rows;
+          ELSE
+            -- only venues that moved; both their old and new area change
+            SELECT array_agg(area.state), array_agg(area.city) INTO states, cities
+            FROM old_rows JOIN new_rows USING (id)
+            CROSS JOIN LATERAL (VALUES
+              (old_rows.state::text, old_rows.city::text),
+              (new_rows.state::text, new_rows.city::text)
+            ) area(state, city)
+            WHERE (old_rows.state, old_rows.city) IS DISTINCT FROM (new_rows.state, new_rows.city);
+          END IF;
+
+          IF states IS NOT NULL THEN
+            PERFORM refresh_venue_areas(states, cities);
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION venue_areas_shows_changed() RETURNS trigger AS $$
+        DECLARE
+          changed_venues integer[];
+          states text[];
+          cities text[];
+        BEGIN
+          -- past shows are not counted, so only upcoming ones matter
+          IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT venue_id) INTO changed_venues FROM new_rows
+            WHERE start_time > localtimestamp;
+          ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT venue_id) INTO changed_venues FROM old_rows
+            WHERE start_time > localtimestamp;
+          ELSE
+            SELECT array_agg(DISTINCT changed.venue_id) INTO changed_venues
+            FROM old_rows JOIN new_rows USING (id)
+            CROSS JOIN LATERAL (VALUES (old_rows.venue_id), (new_rows.venue_id)) changed(venue_id)
+            WHERE (old_rows.venue_id, old_rows.start_time) IS DISTINCT FROM (new_rows.venue_id, new_rows.start_time)
+              AND (old_rows.start_time > localtimestamp OR new_rows.start_time > localtimestamp);
+          END IF;
+
+          -- shows deleted along with their venue find no venue here; the
+          -- venue's own trigger recomputes its area
+          IF changed_venues IS NOT NULL THEN
+            SELECT array_agg(state::text), array_agg(city::text) INTO states, cities
+            FROM venues WHERE id = ANY(changed_venues);
+            IF states IS NOT NULL THEN
+              PERFORM refresh_venue_areas(states, cities);
+            END IF;
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ('venues', 'shows'):
+        op.execute("""
+            CREATE TRIGGER venue_areas_{0}_insert AFTER INSERT ON {0}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE venue_areas_{0}_changed()
+        """.format(table))
+        op.execute("""
+            CREATE TRIGGER venue_areas_{0}_update AFTER UPDATE ON {0}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE venue_areas_{0}_changed()
+        """.format(table))
+        op.execute("""
+            CREATE TRIGGER venue_areas_{0}_delete AFTER DELETE ON {0}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE venue_areas_{0}_changed()
+        """.format(table))
+
+    op.execute("""
+        SELECT refresh_venue_areas(array_agg(state::text), array_agg(city::text))
+        FROM (SELECT DISTINCT state, city FROM venues) areas
+    """)
+
+
+def downgrade():
+    for table in ('venues', 'shows'):
+        for operation in ('insert', 'update', 'delete'):
+            op.execute('DROP TRIGGER venue_areas_{0}_{1} ON {0}'.format(table, operation))
+        op.execute('DROP FUNCTION venue_areas_{}_changed()'.format(table))
+    op.execute('DROP FUNCTION refresh_venue_areas(text[], text[])')
+    op.drop_index('ix_venue_areas_state_city_id', table_name='venue_areas')
+    op.drop_table('venue_areas')
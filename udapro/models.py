@@ -1,16 +1,86 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, TSTZRANGE, TSVECTOR
+
+from replicas import RoutingSQLAlchemy
+
+# reads of @replica_reads views may go to a replica; see replicas.py
+db = RoutingSQLAlchemy()
+
+# length of a show booked without an end time
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+
+def updated_at_column():
+    # UTC time of the last ORM write; with the row version it validates
+    # the detail pages for conditional GETs
+    return db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        server_default=db.text("timezone('utc', now())")
+    )
+
+
+def created_at_column():
+    # UTC time the row was listed; the newest listings are the first rows
+    # of a (created_at DESC, id DESC) index
+    return db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        server_default=db.text("timezone('utc', now())")
+    )
+
+
+def default_end_time(context):
+    return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION
 
-db = SQLAlchemy()
 
 class Show(db.Model):
     __tablename__ = 'shows'
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
     venue = db.relationship('Venue')
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False,)
     artist = db.relationship('Artist')
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False,)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = updated_at_column()
+
+    __mapper_args__ = {'version_id_col': version}
+
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id', postgresql_include=['venue_id', 'artist_id']),
+        db.CheckConstraint('end_time > start_time', name='ck_shows_end_time_after_start_time'),
+        # a venue hosts one show at a time; [start_time, end_time) ranges
+        # of its shows may touch but not overlap
+        ExcludeConstraint(
+            (venue_id, '='),
+            (db.func.tsrange(start_time, end_time), '&&'),
+            name='ex_shows_venue_id_during',
+            using='gist'
+        ),
+    )
+
+class Location(db.Model):
+    # one row per city and state however they were typed; city_key is
+    # location_key(city), the trimmed, lowercased spelling
+    __tablename__ = 'locations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    city_key = db.Column(db.String(120), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('state', 'city_key', name='uq_locations_state_city_key'),
+    )
 
 class Venue(db.Model):
     __tablename__ = 'venues'
@@ -19,6 +89,8 @@ class Venue(db.Model):
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
+    # set by the set_location() trigger from city and state
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
@@ -27,9 +99,24 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    # maintained by the search_vector_update() trigger
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = updated_at_column()
+    created_at = created_at_column()
     artists = db.relationship('Artist', secondary='shows', back_populates='venues')
     shows = db.relationship('Show')
 
+    __mapper_args__ = {'version_id_col': version}
+
+    __table_args__ = (
+        db.Index('ix_venues_state_city_id', 'state', 'city', 'id'),
+        db.Index('ix_venues_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_created_at_id', created_at.desc(), id.desc()),
+        db.Index('ix_venues_location_id_id', 'location_id', 'id'),
+    )
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -40,6 +127,8 @@ class Artist(db.Model):
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
+    # set by the set_location() trigger from city and state
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
@@ -47,7 +136,54 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    # maintained by the search_vector_update() trigger
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = updated_at_column()
+    created_at = created_at_column()
     venues = db.relationship('Venue', secondary='shows', back_populates='artists')
     shows = db.relationship('Show')
 
+    __mapper_args__ = {'version_id_col': version}
+
+    __table_args__ = (
+        db.Index('ix_artists_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_created_at_id', created_at.desc(), id.desc()),
+        db.Index('ix_artists_location_id_id', 'location_id', 'id'),
+    )
+
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
+
+class ArtistAvailability(db.Model):
+    __tablename__ = 'artist_availability'
+
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False)
+    # half-open [starts, ends) window the artist can be booked in
+    during = db.Column(TSTZRANGE, nullable=False)
+
+    __table_args__ = (
+        # btree_gist lets artist_id share the GiST index with the range
+        db.Index('ix_artist_availability_artist_id_during', 'artist_id', 'during',
+                 postgresql_using='gist'),
+    )
+
+
+class VenueArea(db.Model):
+    # rollup of venues by city and state, maintained by triggers on venues
+    # and shows; see `flask refresh-venue-areas`
+    __tablename__ = 'venue_areas'
+
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    venue_count = db.Column(db.Integer, nullable=False)
+    upcoming_show_count = db.Column(db.Integer, nullable=False)
+    venue_ids = db.Column(db.ARRAY(db.Integer), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('state', 'city', name='uq_venue_areas_state_city'),
+        db.Index('ix_venue_areas_state_city_id', 'state', 'city', 'id'),
+    )
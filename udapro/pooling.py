@@ -0,0 +1,149 @@
+import threading
+import time
+
+import click
+from flask import abort, current_app, jsonify, request
+from flask.cli import with_appcontext
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import Pool, QueuePool
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Pool metrics.
+#----------------------------------------------------------------------------#
+
+class PoolStats(object):
+    # counters for this worker's pool; gauges are read from the pool itself
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.waits = 0
+            self.wait_time = 0.0
+            self.max_wait = 0.0
+            self.max_overflow_used = 0
+
+    def record_checkout(self, seconds, overflow, timed_out=False):
+        with self._lock:
+            self.waits += 1
+            self.wait_time += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.max_overflow_used = max(self.max_overflow_used, overflow)
+
+    def record(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self, pool):
+        with self._lock:
+            stats = {
+                'pool': type(pool).__name__,
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'wait_time_ms': round(self.wait_time * 1000, 3),
+                'mean_wait_ms': round(self.wait_time * 1000 / self.waits, 3) if self.waits else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'max_overflow_used': self.max_overflow_used,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+                max_overflow=pool._max_overflow,
+            )
+        return stats
+
+
+pool_stats = PoolStats()
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that times how long each checkout waits for a connection,
+    # and notes how far into overflow the pool has gone
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super(TimedQueuePool, self)._do_get()
+        except TimeoutError:
+            pool_stats.record_checkout(time.perf_counter() - started, 0, timed_out=True)
+            raise
+        pool_stats.record_checkout(time.perf_counter() - started, max(self.overflow(), 0))
+        return connection
+
+
+@event.listens_for(Pool, 'connect')
+def _count_connect(dbapi_connection, connection_record):
+    pool_stats.record('connects')
+
+
+@event.listens_for(Pool, 'invalidate')
+def _count_invalidate(dbapi_connection, connection_record, exception):
+    pool_stats.record('invalidations')
+
+#----------------------------------------------------------------------------#
+# Setup.
+#----------------------------------------------------------------------------#
+
+def init_pool(app):
+    # the profile's options are read when the engine is first created
+    options = dict(app.config['POOL_PROFILES'][app.config['DB_POOL_PROFILE']])
+    options.pop('async_connect_args', None)
+    if options.get('poolclass') is None and 'pool_size' in options:
+        options['poolclass'] = TimedQueuePool
+    connect_args = dict(options.pop('connect_args', {}))
+    connect_args.setdefault('application_name', app.config['DB_APPLICATION_NAME'])
+    options['connect_args'] = connect_args
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    app.add_url_rule('/_stats/pool', 'pool_stats', pool_stats_view)
+    app.cli.add_command(pool_stats_command)
+
+
+def pool_stats_view():
+    # this worker's pool only; each worker process has its own. Pool
+    # internals are for operators: outside debug mode they are only served
+    # to requests made on the host itself, not forwarded by a proxy
+    local = request.remote_addr in LOCAL_ADDRESSES and 'X-Forwarded-For' not in request.headers
+    if not (current_app.debug or local):
+        abort(404)
+    return jsonify(pool_stats.snapshot(db.engine.pool))
+
+
+@click.command('pool-stats')
+@with_appcontext
+def pool_stats_command():
+    """Show the app's connections as Postgres sees them, across workers."""
+    rows = db.session.execute(text("""
+        SELECT state, count(*), coalesce(max(now() - state_change), interval '0')
+        FROM pg_stat_activity
+        WHERE datname = current_database() AND application_name = :name
+          AND pid <> pg_backend_pid()
+        GROUP BY state ORDER BY state
+    """), {'name': current_app.config['DB_APPLICATION_NAME']}).all()
+
+    profile = current_app.config['DB_POOL_PROFILE']
+    click.echo('profile {}: {}'.format(profile, current_app.config['POOL_PROFILES'][profile]))
+    if not rows:
+        click.echo('no connections from {}'.format(current_app.config['DB_APPLICATION_NAME']))
+    for state, count, longest in rows:
+        click.echo('{:<30} {:>5}   longest in state {}'.format(state or 'unknown', count, longest))
@@ -0,0 +1,318 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+from operator import attrgetter
+from urllib.parse import quote, unquote
+
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.orm import joinedload
+
+from models import db, Venue, VenueArea, Artist, Show, ArtistAvailability
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+# the page queries run on the Flask-SQLAlchemy session unless given
+# another; the ASGI app passes the sync side of its AsyncSession
+
+
+def format_cursor(values):
+    # a cursor carries the row's whole sort key, so paging on from it does
+    # not depend on the row still being there; each value is quoted, so
+    # none can contain the separator
+    return '|'.join(
+        quote(value.isoformat() if isinstance(value, datetime) else str(value), safe=':')
+        for value in values
+    )
+
+
+def encode_cursor(columns, row):
+    return format_cursor(getattr(row, column.key) for column in columns)
+
+
+def decode_cursor(columns, cursor):
+    # the sort key encoded by encode_cursor, or None for a missing cursor
+    # or one that is not for these columns
+    if not cursor:
+        return None
+    parts = cursor.split('|')
+    if len(parts) != len(columns):
+        return None
+
+    values = []
+    for column, part in zip(columns, parts):
+        python_type = column.type.python_type
+        try:
+            if python_type is datetime:
+                values.append(datetime.fromisoformat(unquote(part)))
+            else:
+                values.append(python_type(unquote(part)))
+        except ValueError:
+            return None
+    return tuple(values)
+
+
+def keyset_query(query, columns, after=None):
+    # rows following the cursor in the given ordering
+    bound = decode_cursor(columns, after)
+    if bound is not None:
+        query = query.filter(tuple_(*columns) > tuple_(*bound))
+    return query.order_by(*columns)
+
+
+def keyset_page(query, columns, after=None, before=None, limit=50):
+    # columns is the full ordering, ending in the unique key; a page is an
+    # index range scan from the cursor's sort key, however deep it is
+    before = decode_cursor(columns, before)
+    if before is not None:
+        rows = query \
+            .filter(tuple_(*columns) < tuple_(*before)) \
+            .order_by(*[column.desc() for column in columns]) \
+            .limit(limit + 1) \
+            .all()
+        items = rows[:limit][::-1]
+        prev_cursor = encode_cursor(columns, items[0]) if len(rows) > limit else None
+        next_cursor = encode_cursor(columns, items[-1]) if items else None
+    else:
+        rows = keyset_query(query, columns, after) \
+            .limit(limit + 1) \
+            .all()
+        items = rows[:limit]
+        next_cursor = encode_cursor(columns, items[-1]) if len(rows) > limit else None
+        prev_cursor = encode_cursor(columns, items[0]) \
+            if items and decode_cursor(columns, after) is not None else None
+
+    return Page(items, next_cursor, prev_cursor)
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+def split_shows(shows, now, counterpart):
+    # one pass over the eager-loaded shows; counterpart is the relationship
+    # on Show for the other side of the page ('artist' or 'venue')
+    upcoming_shows = []
+    past_shows = []
+
+    for show in sorted(shows, key=attrgetter('start_time')):
+        other = getattr(show, counterpart)
+        data_show = {
+            'id': show.id,
+            counterpart + '_id': other.id,
+            counterpart + '_name': other.name,
+            counterpart + '_image_link': other.image_link,
+            'start_time': show.start_time,
+            # what the show's tile depends on, for the fragment cache
+            'version': '{}.{}'.format(show.version, other.version),
+        }
+
+        if show.start_time > now:
+            upcoming_shows.append(data_show)
+        else:
+            past_shows.append(data_show)
+
+    # most recent past show first
+    past_shows.reverse()
+
+    return upcoming_shows, past_shows
+
+
+def detail_validator(model, show_key, other, other_key, entity_id, now, session=None):
+    # ETag of the detail page, from one aggregate over the entity, its
+    # shows and their counterparts: anything the page renders changes one
+    # of these values, including a show being deleted or moving from
+    # upcoming to past. No timestamp moves with all of those, so the page
+    # has no Last-Modified
+    row = (session or db.session) \
+        .query(
+            model.version,
+            model.updated_at,
+            func.count(Show.id),
+            func.count(Show.id).filter(Show.start_time <= now),
+            func.sum(Show.id),
+            func.sum(Show.version),
+            func.max(Show.updated_at),
+            func.sum(other.version),
+            func.max(other.updated_at)
+        ) \
+        .outerjoin(Show, show_key == model.id) \
+        .outerjoin(other, other.id == other_key) \
+        .filter(model.id == entity_id) \
+        .group_by(model.id) \
+        .first()
+
+    if row is None:
+        return None
+
+    return hashlib.sha1('|'.join(str(value) for value in row).encode('utf-8')).hexdigest()
+
+
+def upcoming_shows_count(show_key, entity_key, now):
+    # correlated count, only evaluated for the rows on the page and
+    # answered from the (venue_id|artist_id, start_time) indexes. Built as
+    # a core select, so it does not start a Flask-SQLAlchemy session of
+    # its own when the page runs on another one
+    return select(func.count(Show.id)) \
+        .where(show_key == entity_key, Show.start_time > now) \
+        .scalar_subquery()
+
+
+def show_page(after=None, before=None, limit=50, session=None):
+    query = (session or db.session) \
+        .query(
+            Show.id,
+            Show.venue_id,
+            Show.artist_id,
+            Show.start_time,
+            Show.version,
+            Venue.name.label('venue_name'),
+            Venue.version.label('venue_version'),
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+            Artist.version.label('artist_version')
+        ) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id)
+    page = keyset_page(query, [Show.start_time, Show.id], after, before, limit)
+
+    return page._replace(items=[{
+        'id': show.id,
+        'venue_id': show.venue_id,
+        'venue_name': show.venue_name,
+        'artist_id': show.artist_id,
+        'artist_name': show.artist_name,
+        'artist_image_link': show.artist_image_link,
+        'start_time': show.start_time,
+        # what the show's tile depends on, for the fragment cache
+        'version': '{}.{}.{}'.format(show.version, show.venue_version, show.artist_version)
+    } for show in page.items])
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+def venue_areas(now, after=None, before=None, limit=10, session=None):
+    # a page of the venue_areas rollup, read off its (state, city, id)
+    # index, then the venues it lists with their upcoming show counts,
+    # looked up by primary key
+    session = session or db.session
+    page = keyset_page(session.query(VenueArea), [VenueArea.state, VenueArea.city, VenueArea.id],
+                       after, before, limit)
+
+    ids = [id for area in page.items for id in area.venue_ids]
+    venues = {}
+    if ids:
+        rows = session \
+            .query(
+                Venue.id,
+                Venue.name,
+                Venue.version,
+                upcoming_shows_count(Show.venue_id, Venue.id, now).label('num_upcoming_shows')
+            ) \
+            .filter(Venue.id.in_(ids)) \
+            .all()
+        venues = {venue.id: venue for venue in rows}
+
+    return page._replace(items=[{
+        'city': area.city,
+        'state': area.state,
+        'venue_count': area.venue_count,
+        'upcoming_show_count': area.upcoming_show_count,
+        'venues': [{
+            'id': venue.id,
+            'name': venue.name,
+            'version': venue.version,
+            'num_upcoming_shows': venue.num_upcoming_shows
+        } for venue in (venues.get(id) for id in area.venue_ids) if venue is not None]
+    } for area in page.items])
+
+
+def venue_validator(venue_id, now, session=None):
+    return detail_validator(Venue, Show.venue_id, Artist, Show.artist_id, venue_id, now, session)
+
+
+def venue_detail(venue_id, now, session=None):
+    # the venue, its shows and each show's artist in one joined query
+    venue = (session or db.session).query(Venue) \
+        .options(
+            joinedload(Venue.shows)
+            .joinedload(Show.artist)
+            .load_only(Artist.id, Artist.name, Artist.image_link, Artist.version)
+        ) \
+        .filter(Venue.id == venue_id) \
+        .first()
+
+    if venue is None:
+        return None
+
+    venue.upcoming_shows, venue.past_shows = split_shows(venue.shows, now, 'artist')
+    venue.upcoming_shows_count = len(venue.upcoming_shows)
+    venue.past_shows_count = len(venue.past_shows)
+
+    return venue
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+def artist_page(now, after=None, before=None, limit=50, session=None):
+    query = (session or db.session) \
+        .query(
+            Artist.id,
+            Artist.name,
+            Artist.version,
+            upcoming_shows_count(Show.artist_id, Artist.id, now).label('num_upcoming_shows')
+        )
+    page = keyset_page(query, [Artist.id], after, before, limit)
+
+    return page._replace(items=[{
+        'id': artist.id,
+        'name': artist.name,
+        'version': artist.version,
+        'num_upcoming_shows': artist.num_upcoming_shows
+    } for artist in page.items])
+
+
+def artist_validator(artist_id, now, session=None):
+    return detail_validator(Artist, Show.artist_id, Venue, Show.venue_id, artist_id, now, session)
+
+
+def artist_detail(artist_id, now, session=None):
+    # the artist, its shows and each show's venue in one joined query
+    artist = (session or db.session).query(Artist) \
+        .options(
+            joinedload(Artist.shows)
+            .joinedload(Show.venue)
+            .load_only(Venue.id, Venue.name, Venue.image_link, Venue.version)
+        ) \
+        .filter(Artist.id == artist_id) \
+        .first()
+
+    if artist is None:
+        return None
+
+    artist.upcoming_shows, artist.past_shows = split_shows(artist.shows, now, 'venue')
+    artist.upcoming_shows_count = len(artist.upcoming_shows)
+    artist.past_shows_count = len(artist.past_shows)
+
+    return artist
+
+
+def artist_windows(artist_id, now, session=None):
+    # windows that have not ended yet, soonest first
+    during = ArtistAvailability.during
+    return (session or db.session) \
+        .query(
+            ArtistAvailability.id,
+            func.lower(during).label('starts'),
+            func.upper(during).label('ends')
+        ) \
+        .filter(
+            ArtistAvailability.artist_id == artist_id,
+            or_(func.upper_inf(during), func.upper(during) > now)
+        ) \
+        .order_by(func.lower(during)) \
+        .all()
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import deque
+
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Recently listed venues and artists.
+#----------------------------------------------------------------------------#
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+}
+
+
+class RecentListings(object):
+    # per kind, the newest listings, newest first, in a deque bounded to
+    # the number the home page shows. Creates in this worker are pushed
+    # onto it; listings made by other workers show up once it is reloaded
+    # from the created_at index, at most every `ttl` seconds
+
+    def __init__(self, size=10, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._listings = {kind: deque(maxlen=size) for kind in MODELS}
+        self._loaded_at = {kind: None for kind in MODELS}
+
+    def init_app(self, app):
+        self.size = app.config['RECENT_LISTINGS']
+        self.ttl = app.config['RECENT_LISTINGS_TTL']
+        self._listings = {kind: deque(maxlen=self.size) for kind in MODELS}
+        app.jinja_env.globals['recent_listings'] = self.recent
+
+    def load(self, kind):
+        model = MODELS[kind]
+        rows = db.session \
+            .query(model.id, model.name, model.image_link) \
+            .order_by(model.created_at.desc(), model.id.desc()) \
+            .limit(self.size) \
+            .all()
+
+        with self._lock:
+            self._listings[kind] = deque((self._listing(row) for row in rows), maxlen=self.size)
+            self._loaded_at[kind] = time.time()
+
+    def recent(self, kind):
+        loaded_at = self._loaded_at[kind]
+        if loaded_at is None or time.time() - loaded_at > self.ttl:
+            self.load(kind)
+        with self._lock:
+            return list(self._listings[kind])
+
+    def add(self, kind, listing):
+        # a full deque drops its oldest listing
+        with self._lock:
+            if self._loaded_at[kind] is not None:
+                self._listings[kind].appendleft(self._listing(listing))
+
+    def changed(self, kind, id):
+        # an edited or deleted listing is reloaded with the rest, which also
+        # brings in the listing a deletion makes room for
+        with self._lock:
+            if any(listing['id'] == id for listing in self._listings[kind]):
+                self._loaded_at[kind] = None
+
+    @staticmethod
+    def _listing(row):
+        return {'id': row.id, 'name': row.name, 'image_link': row.image_link}
+
+
+recent_listings = RecentListings()
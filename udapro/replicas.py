@@ -0,0 +1,117 @@
+import random
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.orm import Session
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# views marked with @replica_reads run their queries on a replica, one
+# picked per request; everything else, and any flush or INSERT / UPDATE /
+# DELETE, goes to the primary. A client that has just written reads from
+# the primary for REPLICA_STICKY_SECONDS, so the page it is redirected to
+# shows its change even if the replicas are behind; it also skips the
+# listing cache, and listings built from a replica that soon after an
+# invalidation are not cached (see app.cached). Other clients may see a
+# write late, by the replica's lag
+
+STICKY_COOKIE = 'read_primary_until'
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        self.replica = None
+        super(RoutingSession, self).__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        keys = self.app.extensions.get('replicas')
+        if not keys or self._flushing or getattr(clause, 'is_dml', False) or not reading_from_replica():
+            return super(RoutingSession, self).get_bind(mapper, clause)
+
+        # one replica for the whole request, so its reads are consistent
+        # with each other
+        if self.replica is None:
+            self.replica = self.db.get_engine(self.app, bind=random.choice(keys))
+        return self.replica
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def reading_from_replica():
+    return has_request_context() and bool(current_app.extensions.get('replicas')) and g.get('read_replica', False)
+
+
+def pinned_to_primary():
+    # the client wrote within REPLICA_STICKY_SECONDS
+    return request.cookies.get(STICKY_COOKIE, 0, type=float) > time.time()
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = not pinned_to_primary()
+        return view(*args, **kwargs)
+    return wrapper
+
+#----------------------------------------------------------------------------#
+# Stickiness.
+#----------------------------------------------------------------------------#
+
+def _mark_written(session):
+    session.info['wrote'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_flush(session, flush_context):
+    _mark_written(session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_written(orm_execute_state.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _pin_to_primary(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        g.wrote = True
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_write(session):
+    session.info.pop('wrote', None)
+
+#----------------------------------------------------------------------------#
+# Setup.
+#----------------------------------------------------------------------------#
+
+def init_replicas(app):
+    # each replica is a bind of its own, with the primary's engine options;
+    # no model is bound to one, so only the routing session uses them
+    keys = []
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for number, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+        key = 'replica_{}'.format(number)
+        binds[key] = uri
+        keys.append(key)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['replicas'] = keys
+
+    @app.after_request
+    def pin_writer(response):
+        if keys and g.get('wrote'):
+            seconds = app.config['REPLICA_STICKY_SECONDS']
+            response.set_cookie(STICKY_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True)
+        return response
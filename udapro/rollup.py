@@ -0,0 +1,43 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from cache import cache
+from models import db
+
+#----------------------------------------------------------------------------#
+# Venue area rollup.
+#----------------------------------------------------------------------------#
+
+# set for a session or transaction, the rollup triggers skip its writes;
+# bulk loads use it and refresh the areas they touched once at the end
+DEFER_TRIGGERS = "SET {} venue_areas.deferred = 'on'"
+
+# every area with a venue, and every area listed, so emptied ones go
+REFRESH_ALL = """
+    SELECT coalesce(refresh_venue_areas(array_agg(state::text), array_agg(city::text)), 0)
+    FROM (
+      SELECT state, city FROM venues
+      UNION
+      SELECT state, city FROM venue_areas
+    ) areas
+"""
+
+@click.command('refresh-venue-areas')
+@with_appcontext
+def refresh_venue_areas_command():
+    """Recompute the venue_areas rollup from venues and shows.
+
+    Triggers keep the rollup current as venues and shows are written. Run
+    this on a schedule to stop counting shows that have since passed, and
+    after loading data with the triggers deferred.
+    """
+    started = time.time()
+    changed = db.session.execute(text(REFRESH_ALL)).scalar()
+    db.session.commit()
+
+    if changed:
+        cache.invalidate_workers(('venues',))
+    click.echo('{} areas changed in {:.1f}s'.format(changed, time.time() - started))
@@ -0,0 +1,117 @@
+import re
+
+from sqlalchemy import and_, desc, func, or_
+
+from models import db, Venue, Artist, Location, Show
+from queries import upcoming_shows_count
+
+#----------------------------------------------------------------------------#
+# Full-text and trigram search.
+#----------------------------------------------------------------------------#
+
+# the show column pointing back at each searchable model
+SHOW_KEYS = {
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+# "San Francisco, CA"
+LOCATION = re.compile(r'^\s*(?P<city>[^,]+?)\s*,\s*(?P<state>[A-Za-z]{2})\s*$')
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search(model, search_term, now, limit, offset=0, session=None):
+    # matches on the GIN indexed tsvector (name, city, state, genres) or on
+    # the trigram index over name, which covers partial, case-insensitive
+    # and slightly misspelled names. A search for "City, ST" lists the
+    # venues or artists of that location instead
+    results = location_search(model, search_term, now, limit, offset, session)
+    if results is not None:
+        return results
+
+    term = search_term.strip()
+    tsquery = func.plainto_tsquery('simple', term)
+    rank = func.greatest(
+        func.ts_rank(model.search_vector, tsquery),
+        func.similarity(model.name, term)
+    )
+
+    rows = (session or db.session) \
+        .query(
+            model.id,
+            model.name,
+            func.count(Show.id).label('num_upcoming_shows'),
+            rank.label('rank'),
+            func.count().over().label('total')
+        ) \
+        .outerjoin(Show, and_(SHOW_KEYS[model] == model.id, Show.start_time > now)) \
+        .filter(or_(
+            model.search_vector.op('@@')(tsquery),
+            model.name.ilike('%{}%'.format(escape_like(term)), escape='\\'),
+            model.name.op('%')(term)
+        )) \
+        .group_by(model.id) \
+        .order_by(desc('rank'), model.name, model.id) \
+        .limit(limit) \
+        .offset(offset) \
+        .all()
+
+    count = rows[0].total if rows else 0
+    next_offset = offset + limit if offset + limit < count else None
+
+    return {
+        'count': count,
+        'offset': offset,
+        'next_offset': next_offset,
+        'data': [{
+            'id': row.id,
+            'name': row.name,
+            'num_upcoming_shows': row.num_upcoming_shows
+        } for row in rows]
+    }
+
+
+def location_search(model, search_term, now, limit, offset=0, session=None):
+    # a "City, ST" term lists the venues or artists linked to that location,
+    # matched on its normalized key and read off the location_id index;
+    # None when the term is not one, or nothing is there, so the caller
+    # falls back to a name search
+    match = LOCATION.match(search_term)
+    if match is None:
+        return None
+
+    rows = (session or db.session) \
+        .query(
+            model.id,
+            model.name,
+            upcoming_shows_count(SHOW_KEYS[model], model.id, now).label('num_upcoming_shows'),
+            func.count().over().label('total')
+        ) \
+        .join(Location, Location.id == model.location_id) \
+        .filter(
+            Location.state == match.group('state').upper(),
+            Location.city_key == func.location_key(match.group('city'))
+        ) \
+        .order_by(model.id) \
+        .limit(limit) \
+        .offset(offset) \
+        .all()
+    if not rows and not offset:
+        return None
+
+    count = rows[0].total if rows else 0
+    next_offset = offset + limit if offset + limit < count else None
+
+    return {
+        'count': count,
+        'offset': offset,
+        'next_offset': next_offset,
+        'data': [{
+            'id': row.id,
+            'name': row.name,
+            'num_upcoming_shows': row.num_upcoming_shows
+        } for row in rows]
+    }
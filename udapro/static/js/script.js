@@ -2,3 +2,37 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// typeahead for the navbar search boxes, fed by /search/suggest
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-suggest]');
+  Array.prototype.forEach.call(inputs, function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var pending = null;
+
+    input.addEventListener('input', function () {
+      var q = input.value.trim();
+      if (pending) {
+        pending.abort();
+      }
+      if (!q) {
+        list.innerHTML = '';
+        return;
+      }
+      pending = new XMLHttpRequest();
+      pending.open('GET', '/search/suggest?type=' + input.getAttribute('data-suggest') + '&q=' + encodeURIComponent(q));
+      pending.onload = function () {
+        if (this.status !== 200) {
+          return;
+        }
+        list.innerHTML = '';
+        JSON.parse(this.responseText).suggestions.forEach(function (suggestion) {
+          var option = document.createElement('option');
+          option.value = suggestion.name;
+          list.appendChild(option);
+        });
+      };
+      pending.send();
+    });
+  });
+});
@@ -0,0 +1,198 @@
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app
+
+from cache import cache
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# In-process typeahead index.
+#----------------------------------------------------------------------------#
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+}
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+class SuggestIndex(object):
+    # a snapshot of every name, per worker. Writes in this worker update it
+    # in place; those of other workers and of the CLI are picked up by
+    # reloading it when the venues or artists cache tags move (which the
+    # socket backend shares between processes), at most every `interval`
+    # seconds, and at the latest after `ttl` seconds. Reloads run in a
+    # background thread; lookups use the old snapshot until it is replaced
+
+    def __init__(self, ttl=300, interval=10):
+        self.ttl = ttl
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._versions = None
+        self._loader = None
+        # per kind, a sorted list of (word, lowercased name, id) for every
+        # word of every name; all names with a word starting with a given
+        # prefix form one contiguous slice of that list
+        self._entries = {kind: [] for kind in MODELS}
+        self._names = {}
+        self._words = {}
+
+    def init_app(self, app):
+        self.ttl = app.config['SUGGEST_TTL']
+        self.interval = app.config['SUGGEST_RELOAD_INTERVAL']
+        app.before_request(self._first_load)
+
+    def load(self):
+        versions = cache.backend.tag_versions(tuple(MODELS))
+        names = {}
+        for kind, model in MODELS.items():
+            rows = db.session.query(model.id, model.name).yield_per(10000)
+            for id, name in rows:
+                names[(kind, id)] = name
+        self.replace(names, versions)
+
+    def replace(self, names, versions=None):
+        # names is {(kind, id): name}; versions the cache tag versions read
+        # before the names were, so writes made meanwhile reload it again
+        entries = {kind: [] for kind in MODELS}
+        words = {}
+        for key, name in names.items():
+            words[key] = tuple(tokenize(name))
+            entries[key[0]].extend(self._entries_for(key, name))
+        for kind_entries in entries.values():
+            kind_entries.sort()
+
+        with self._lock:
+            self._names = names
+            self._words = words
+            self._entries = entries
+            self._versions = versions
+            self._loaded_at = time.time()
+
+    def refresh(self):
+        # starts a background reload if the snapshot is missing or stale
+        # and this process is not already loading one
+        with self._lock:
+            loader = self._loader
+            if loader is not None and loader[0] == os.getpid() and loader[1].is_alive():
+                return
+            if not self._stale():
+                return
+            thread = threading.Thread(target=self._reload, args=(current_app._get_current_object(),))
+            thread.daemon = True
+            self._loader = (os.getpid(), thread)
+        thread.start()
+
+    def add(self, kind, id, name):
+        # also used for renames: the old entries are dropped first
+        if self._loaded_at is None:
+            return
+        key = (kind, id)
+        with self._lock:
+            self._discard(key)
+            self._names[key] = name
+            self._words[key] = tuple(tokenize(name))
+            for entry in self._entries_for(key, name):
+                insort(self._entries[kind], entry)
+
+    def remove(self, kind, id):
+        if self._loaded_at is None:
+            return
+        with self._lock:
+            self._discard((kind, id))
+
+    def suggest(self, text, kind, limit=10):
+        prefixes = tokenize(text)
+        if not prefixes or limit <= 0:
+            return []
+
+        # nothing is suggested until this worker's first load is in
+        self.refresh()
+        results = []
+        seen = set()
+
+        with self._lock:
+            entries = self._entries[kind]
+            # walk the slice of the most selective prefix, in word and
+            # name order, and check the remaining prefixes against each
+            # candidate's words
+            start, end = self._narrowest(entries, prefixes)
+            for i in range(start, end):
+                id = entries[i][2]
+                if id in seen:
+                    continue
+                seen.add(id)
+
+                key = (kind, id)
+                if not self._matches(self._words[key], prefixes):
+                    continue
+                results.append({'type': kind, 'id': id, 'name': self._names[key]})
+                if len(results) >= limit:
+                    break
+
+        return results
+
+    def _stale(self):
+        if self._loaded_at is None:
+            return True
+        age = time.time() - self._loaded_at
+        if age > self.ttl:
+            return True
+        if age < self.interval:
+            return False
+        versions = cache.backend.tag_versions(tuple(MODELS))
+        return versions is not None and versions != self._versions
+
+    def _first_load(self):
+        # each worker starts loading with its first request, so a forked
+        # worker loads its own and CLI commands never do
+        if self._loaded_at is None:
+            self.refresh()
+
+    def _reload(self, app):
+        with app.app_context():
+            try:
+                self.load()
+            except Exception:
+                app.logger.exception('loading the suggest index failed')
+
+    @staticmethod
+    def _narrowest(entries, prefixes):
+        ranges = []
+        for prefix in prefixes:
+            start = bisect_left(entries, (prefix,))
+            end = bisect_left(entries, (prefix + '\uffff',), start)
+            ranges.append((end - start, start, end))
+        _, start, end = min(ranges)
+        return start, end
+
+    def _discard(self, key):
+        name = self._names.pop(key, None)
+        self._words.pop(key, None)
+        if name is None:
+            return
+        entries = self._entries[key[0]]
+        for entry in self._entries_for(key, name):
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+
+    @staticmethod
+    def _entries_for(key, name):
+        name_key = (name or '').lower()
+        return {(word, name_key, key[1]) for word in tokenize(name)}
+
+    @staticmethod
+    def _matches(words, prefixes):
+        return all(any(word.startswith(prefix) for word in words) for prefix in prefixes)
+
+
+suggest_index = SuggestIndex()
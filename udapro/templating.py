@@ -0,0 +1,62 @@
+import jinja2
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cache import MemoryCache
+
+#----------------------------------------------------------------------------#
+# Template fragment cache.
+#----------------------------------------------------------------------------#
+
+class FragmentCacheExtension(Extension):
+    # {% cache 'show-tile', show.id, show.version %} ... {% endcache %}
+    #
+    # the key parts name everything the fragment renders, row versions
+    # included, so an edited row simply stops matching its old fragments.
+    # Nothing has to be invalidated, and the store is local to the worker:
+    # a round trip to a shared cache would cost more than the fragment
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=MemoryCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [nodes.List(parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        store = self.environment.fragment_cache
+        key = ':'.join(str(part) for part in parts)
+
+        hit, fragment = store.get(key)
+        if not hit:
+            fragment = str(caller())
+            store.set(key, fragment)
+        return Markup(fragment)
+
+
+def init_templates(app):
+    # compiled templates are kept on disk, so a restarted worker loads them
+    # instead of compiling them again; None is a per-user temp directory.
+    # Bytecode from another Jinja release fails when run, and Jinja does
+    # not tell them apart, so the file names carry the release
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+      app.config['JINJA_BYTECODE_CACHE_DIR'],
+      '__jinja2_{}_%s.cache'.format(jinja2.__version__)
+    )
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = MemoryCache(
+      app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+      app.config['FRAGMENT_CACHE_TTL']
+    )
@@ -0,0 +1,47 @@
+import os
+import sys
+
+# the app's modules import each other by name, from the app directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import text
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture(scope='session')
+def database():
+    # tests that need Postgres run on TEST_DATABASE_URL, migrated from an
+    # empty schema; whatever the database held is dropped. Without it they
+    # are skipped
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+
+    from flask_migrate import upgrade
+    from app import app
+    from models import db
+
+    app.config.update(SQLALCHEMY_DATABASE_URI=url, TESTING=True)
+    with app.app_context():
+        db.session.execute(text('DROP SCHEMA public CASCADE; CREATE SCHEMA public'))
+        db.session.commit()
+        upgrade(directory=MIGRATIONS)
+    return app
+
+
+@pytest.fixture
+def app(database):
+    # each test starts from empty tables and an empty cache
+    from cache import cache
+    from models import db
+
+    with database.app_context():
+        db.session.execute(text(
+            'TRUNCATE shows, artist_availability, venue_areas, venues, artists, locations RESTART IDENTITY CASCADE'
+        ))
+        db.session.commit()
+        cache.backend.clear()
+        yield database
+        db.session.remove()
@@ -0,0 +1,36 @@
+from sqlalchemy import text
+
+from models import db
+
+
+def page_through(client, path):
+    # follows "next" to the end, guarding against a cursor that loops
+    ids = []
+    url = path
+    for _ in range(20):
+        body = client.get(url).get_json()
+        ids += [item['id'] for item in body['data']]
+        if body['next'] is None:
+            return ids
+        url = '{}&after={}'.format(path, body['next'])
+    raise AssertionError('still paging after 20 pages: {}'.format(ids))
+
+
+def test_shows_page_to_the_end(app):
+    db.session.execute(text("""
+        INSERT INTO venues (name, city, state) VALUES ('The Musical Hop', 'San Francisco', 'CA'),
+          ('Park Square Live Music & Coffee', 'San Francisco', 'CA');
+        INSERT INTO artists (name, city, state) VALUES ('Guns N Petals', 'San Francisco', 'CA');
+    """))
+    # two shows at each start time, one per venue, so pages split ties
+    db.session.execute(text("""
+        INSERT INTO shows (venue_id, artist_id, start_time, end_time)
+        SELECT 1 + i % 2, 1, timestamp '2035-05-01 20:00' + (i / 2) * interval '1 day',
+               timestamp '2035-05-01 22:00' + (i / 2) * interval '1 day'
+        FROM generate_series(0, 6) i
+    """))
+    db.session.commit()
+
+    client = app.test_client()
+    assert page_through(client, '/api/v1/shows?fields=id,start_time&limit=3') == [1, 2, 3, 4, 5, 6, 7]
+    assert page_through(client, '/api/v1/venues?fields=id,name&limit=1') == [1, 2]
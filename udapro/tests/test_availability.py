@@ -0,0 +1,27 @@
+import re
+
+from sqlalchemy import text
+
+from models import db
+
+
+def windows():
+    return db.session.execute(text('SELECT count(*) FROM artist_availability')).scalar()
+
+
+def test_removing_a_window_needs_the_csrf_token(app):
+    db.session.execute(text("INSERT INTO artists (name, city, state) VALUES ('Guns N Petals', 'San Francisco', 'CA')"))
+    db.session.execute(text(
+        "INSERT INTO artist_availability (artist_id, during) VALUES (1, tstzrange('2035-05-01', '2035-06-01'))"
+    ))
+    db.session.commit()
+    client = app.test_client()
+
+    assert client.post('/artists/1/availability/1/delete').status_code == 400
+    assert windows() == 1
+
+    page = client.get('/artists/1/availability').get_data(as_text=True)
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    response = client.post('/artists/1/availability/1/delete', data={'csrf_token': token})
+    assert response.status_code == 302
+    assert windows() == 0
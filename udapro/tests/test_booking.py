@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from booking import parse_entry, parse_time
+from models import DEFAULT_SHOW_DURATION
+
+
+def entry(**fields):
+    return dict({'artist_id': '1', 'venue_id': '2', 'start_time': '2026-05-01 20:00'}, **fields)
+
+
+def test_parse_time_accepts_minutes_and_seconds():
+    assert parse_time('2026-05-01 20:00') == datetime(2026, 5, 1, 20, 0)
+    assert parse_time(' 2026-05-01T20:00:30 ') == datetime(2026, 5, 1, 20, 0, 30)
+
+
+def test_parse_time_rejects_offsets_and_garbage():
+    assert parse_time('2026-05-01T20:00+02:00') is None
+    assert parse_time(datetime(2026, 5, 1, 20, tzinfo=timezone.utc)) is None
+    assert parse_time('2026-02-30 20:00') is None
+    assert parse_time('tonight') is None
+    assert parse_time(None) is None
+
+
+def test_parse_entry_defaults_end_time():
+    row, error = parse_entry(entry())
+    assert error is None
+    assert row == (1, 2, datetime(2026, 5, 1, 20, 0), datetime(2026, 5, 1, 20, 0) + DEFAULT_SHOW_DURATION)
+
+
+def test_parse_entry_keeps_end_time():
+    row, error = parse_entry(entry(end_time='2026-05-01 23:30'))
+    assert error is None
+    assert row[3] == datetime(2026, 5, 1, 23, 30)
+
+
+def test_parse_entry_rejects_bad_ids():
+    row, error = parse_entry(entry(venue_id='two'))
+    assert row is None
+    assert 'integers' in error
+
+
+def test_parse_entry_rejects_bad_start_time():
+    row, error = parse_entry(entry(start_time='2026-05-01T20:00Z'))
+    assert row is None
+    assert error.startswith('start_time')
+
+
+def test_parse_entry_rejects_end_before_start():
+    start = datetime(2026, 5, 1, 20, 0)
+    row, error = parse_entry(entry(start_time=start, end_time=start - timedelta(hours=1)))
+    assert row is None
+    assert error.startswith('end_time')
+
+
+def test_parse_entry_rejects_mixed_offsets():
+    row, error = parse_entry(entry(end_time='2026-05-01T23:00+00:00'))
+    assert row is None
+    assert error.startswith('end_time')
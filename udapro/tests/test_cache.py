@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+from cache import Cache, MemoryCache, NullCache, cache_key
+from werkzeug.datastructures import MultiDict
+
+
+@pytest.fixture
+def store():
+    return MemoryCache(max_entries=3, default_ttl=60)
+
+
+@pytest.fixture
+def cache(store):
+    cache = Cache()
+    cache.backend = store
+    return cache
+
+
+def test_get_and_set(store):
+    assert store.get('a') == (False, None)
+    assert store.set('a', 1)
+    assert store.get('a') == (True, 1)
+
+
+def test_ttl_expiry(store, monkeypatch):
+    store.set('a', 1, ttl=10)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert store.get('a') == (False, None)
+    assert 'a' not in store._data
+
+
+def test_least_recently_used_is_evicted(store):
+    for key in 'abc':
+        store.set(key, key)
+    store.get('a')
+    store.set('d', 'd')
+    assert store.get('b') == (False, None)
+    assert [key for key in 'acd' if store.get(key)[0]] == ['a', 'c', 'd']
+
+
+def test_invalidate_drops_tagged_entries(store):
+    store.set('venues', 1, tags=('venues', 'shows'))
+    store.set('artists', 2, tags=('artists', 'shows'))
+    store.invalidate(('venues',))
+    assert store.get('venues') == (False, None)
+    assert store.get('artists') == (True, 2)
+    store.invalidate(('shows',))
+    assert store.get('artists') == (False, None)
+
+
+def test_set_is_refused_after_invalidation_during_build(store):
+    versions = store.tag_versions(('venues',))
+    store.invalidate(('venues',))
+    assert not store.set('venues', 1, tags=('venues',), versions=versions)
+    assert store.get('venues') == (False, None)
+
+
+def test_invalidated_within(store, monkeypatch):
+    assert not store.invalidated_within(('venues',), 10)
+    store.invalidate(('venues',))
+    assert store.invalidated_within(('shows', 'venues'), 10)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert not store.invalidated_within(('venues',), 10)
+
+
+def test_lease_is_exclusive_until_released(store):
+    token = store.acquire_lease('a', 5)
+    assert token is not None
+    assert store.acquire_lease('a', 5) is None
+    store.release_lease('a', token)
+    assert store.acquire_lease('a', 5) is not None
+
+
+def test_expired_lease_is_not_released_by_its_old_holder(store, monkeypatch):
+    old = store.acquire_lease('a', 5)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 6)
+    new = store.acquire_lease('a', 5)
+    assert new is not None and new != old
+
+    store.release_lease('a', old)
+    assert store.acquire_lease('a', 5) is None
+    store.release_lease('a', new)
+    assert store.acquire_lease('a', 5) is not None
+
+
+def test_get_or_set_builds_once(cache):
+    calls = []
+    assert cache.get_or_set('a', lambda: calls.append(1) or 'value') == 'value'
+    assert cache.get_or_set('a', lambda: calls.append(1) or 'other') == 'value'
+    assert len(calls) == 1
+
+
+def test_get_or_set_single_flight(cache):
+    calls = []
+    started = threading.Event()
+
+    def build():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_set('a', build))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['value'] * 5
+    assert len(calls) == 1
+    assert cache._flights == {}
+
+
+def test_get_or_set_releases_its_lease_on_error(cache, store):
+    def fail():
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_set('a', fail)
+    assert store._leases == {}
+
+
+def test_get_or_set_does_not_store_while_settling(cache, store):
+    store.invalidate(('venues',))
+    assert cache.get_or_set('a', lambda: 1, tags=('venues',), settle=10) == 1
+    assert store.get('a') == (False, None)
+    assert cache.get_or_set('a', lambda: 2, tags=('venues',)) == 2
+    assert store.get('a') == (True, 2)
+
+
+def test_null_cache_always_builds():
+    cache = Cache()
+    cache.backend = NullCache()
+    assert cache.get_or_set('a', lambda: 1) == 1
+    assert cache.get_or_set('a', lambda: 2) == 2
+
+
+def test_cache_key_sorts_arguments():
+    assert cache_key('venues', MultiDict([('b', '2'), ('a', '1')])) == 'venues?a=1&b=2'
+    long_key = cache_key('search', MultiDict([('q', 'x' * 300)]))
+    assert len(long_key) == len('search?') + 40
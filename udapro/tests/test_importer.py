@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from importer import import_command
+from models import db
+
+
+def write(tmp_path, name, lines):
+    path = tmp_path / name
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def seed_venue_and_artist():
+    db.session.execute(text("INSERT INTO venues (name, city, state) VALUES ('The Musical Hop', 'San Francisco', 'CA')"))
+    db.session.execute(text("INSERT INTO artists (name, city, state) VALUES ('Guns N Petals', 'San Francisco', 'CA')"))
+    db.session.commit()
+
+
+def test_import_shows_next_to_booked_ones(app, tmp_path):
+    seed_venue_and_artist()
+    db.session.execute(text(
+        "INSERT INTO shows (venue_id, artist_id, start_time, end_time) "
+        "VALUES (1, 1, '2035-05-01 20:00', '2035-05-01 22:00')"
+    ))
+    db.session.commit()
+
+    shows = write(tmp_path, 'shows.csv', [
+        'venue_id,artist_id,start_time,end_time',
+        '1,1,2035-05-01 22:00,2035-05-01 23:00',
+        '1,1,2035-05-02 20:00,',
+        '1,1,2035-05-01 21:00,2035-05-01 23:30',
+    ])
+    result = app.test_cli_runner().invoke(import_command, ['shows', shows])
+    assert result.exit_code == 0, result.output
+
+    starts = db.session.execute(text('SELECT start_time FROM shows ORDER BY start_time')).scalars().all()
+    assert starts == [datetime(2035, 5, 1, 20, 0), datetime(2035, 5, 1, 22, 0), datetime(2035, 5, 2, 20, 0)]
+    assert '3 rows staged' in result.output and '2 rows merged, 1 rejected' in result.output
+
+
+def test_import_writes_rejects_with_reasons(app, tmp_path):
+    seed_venue_and_artist()
+    shows = write(tmp_path, 'shows.csv', [
+        'venue_id,artist_id,start_time,end_time',
+        '1,1,2035-05-01 20:00,',
+        '1,9,2035-05-02 20:00,',
+        '1,1,2035-02-30 25:61,',
+    ])
+    rejects = str(tmp_path / 'rejects.csv')
+    result = app.test_cli_runner().invoke(import_command, ['shows', shows, '--rejects', rejects])
+    assert result.exit_code == 0, result.output
+
+    assert db.session.execute(text('SELECT count(*) FROM shows')).scalar() == 1
+    with open(rejects) as written:
+        assert written.read().splitlines() == [
+            'line,reason,id,venue_id,artist_id,start_time,end_time',
+            '2,no artist with this artist_id,,1,9,2035-05-02 20:00,',
+            '3,start_time must be a date and time,,1,1,2035-02-30 25:61,',
+        ]
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from queries import decode_cursor, encode_cursor, keyset_page
+
+Base = declarative_base()
+
+
+class Gig(Base):
+    __tablename__ = 'gigs'
+
+    id = Column(Integer, primary_key=True)
+    start_time = Column(DateTime, nullable=False)
+
+
+class Area(Base):
+    __tablename__ = 'areas'
+
+    id = Column(Integer, primary_key=True)
+    state = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+
+
+GIG_ORDER = [Gig.start_time, Gig.id]
+AREA_ORDER = [Area.state, Area.city, Area.id]
+START = datetime(2026, 10, 17, 20, 0)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        # two gigs share each start time, so the id breaks the ties
+        session.add_all(Gig(id=id, start_time=START + timedelta(hours=(id - 1) // 2)) for id in range(1, 11))
+        session.add_all([
+            Area(id=1, state='CA', city='San Francisco'),
+            Area(id=2, state='CA', city='San Jose'),
+            Area(id=3, state='NY', city='New York'),
+            Area(id=4, state='NY', city='Pipe|Town'),
+            Area(id=5, state='WA', city='Seattle'),
+        ])
+        session.commit()
+        yield session
+
+
+def ids(page):
+    return [row.id for row in page.items]
+
+
+def test_cursor_round_trip():
+    gig = Gig(id=7, start_time=START)
+    assert decode_cursor(GIG_ORDER, encode_cursor(GIG_ORDER, gig)) == (START, 7)
+
+    area = Area(id=4, state='NY', city='Pipe|Town')
+    assert decode_cursor(AREA_ORDER, encode_cursor(AREA_ORDER, area)) == ('NY', 'Pipe|Town', 4)
+
+
+@pytest.mark.parametrize('cursor', [None, '', 'abc', '1|2', '2026-13-01T00:00:00|1', 'soon|1'])
+def test_malformed_cursor_is_ignored(cursor):
+    assert decode_cursor(GIG_ORDER, cursor) is None
+
+
+def test_pages_forward_and_back(session):
+    query = session.query(Gig)
+    first = keyset_page(query, GIG_ORDER, limit=4)
+    assert ids(first) == [1, 2, 3, 4]
+    assert first.prev_cursor is None
+
+    second = keyset_page(query, GIG_ORDER, after=first.next_cursor, limit=4)
+    assert ids(second) == [5, 6, 7, 8]
+
+    last = keyset_page(query, GIG_ORDER, after=second.next_cursor, limit=4)
+    assert ids(last) == [9, 10]
+    assert last.next_cursor is None
+
+    back = keyset_page(query, GIG_ORDER, before=last.prev_cursor, limit=4)
+    assert ids(back) == [5, 6, 7, 8]
+    assert back.next_cursor == second.next_cursor
+
+
+def test_deleted_cursor_row_still_pages(session):
+    query = session.query(Gig)
+    first = keyset_page(query, GIG_ORDER, limit=4)
+    second = keyset_page(query, GIG_ORDER, after=first.next_cursor, limit=4)
+
+    session.query(Gig).filter(Gig.id.in_([4, 5])).delete(synchronize_session=False)
+    assert ids(keyset_page(query, GIG_ORDER, after=first.next_cursor, limit=4)) == [6, 7, 8, 9]
+    assert ids(keyset_page(query, GIG_ORDER, before=second.prev_cursor, limit=4)) == [1, 2, 3]
+
+
+def test_text_keys_with_separator(session):
+    query = session.query(Area)
+    first = keyset_page(query, AREA_ORDER, limit=3)
+    assert ids(first) == [1, 2, 3]
+
+    second = keyset_page(query, AREA_ORDER, after=first.next_cursor, limit=3)
+    assert ids(second) == [4, 5]
+    assert ids(keyset_page(query, AREA_ORDER, before=second.prev_cursor, limit=3)) == [1, 2, 3]
+
+
+def test_single_column_cursor_is_the_id(session):
+    page = keyset_page(session.query(Gig), [Gig.id], limit=3)
+    assert page.next_cursor == '3'
+    assert ids(keyset_page(session.query(Gig), [Gig.id], after='3', limit=3)) == [4, 5, 6]
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from cache import cache, MemoryCache
+from suggest import SuggestIndex
+
+NAMES = {
+    ('venues', 1): 'The Musical Hop',
+    ('venues', 2): 'Park Square Live Music & Coffee',
+    ('venues', 3): 'The Dueling Pianos Bar',
+    ('artists', 1): 'Guns N Petals',
+}
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex()
+    index.replace(dict(NAMES))
+    return index
+
+
+@pytest.fixture(autouse=True)
+def memory_backend(monkeypatch):
+    monkeypatch.setattr(cache, 'backend', MemoryCache())
+
+
+def names(results):
+    return [result['name'] for result in results]
+
+
+def test_prefix_of_any_word(index):
+    assert names(index.suggest('mus', 'venues')) == ['Park Square Live Music & Coffee', 'The Musical Hop']
+
+
+def test_every_prefix_must_match(index):
+    assert names(index.suggest('the mus', 'venues')) == ['The Musical Hop']
+    assert index.suggest('the coffee', 'venues') == []
+
+
+def test_kinds_are_separate(index):
+    assert names(index.suggest('guns', 'artists')) == ['Guns N Petals']
+    assert index.suggest('guns', 'venues') == []
+
+
+def test_limit(index):
+    assert len(index.suggest('the', 'venues', limit=1)) == 1
+    assert index.suggest('the', 'venues', limit=0) == []
+
+
+def test_matches_past_many_non_matching_candidates():
+    # a common word's slice is walked to the end, not cut off
+    names = {('venues', id): 'Venue {}'.format(id) for id in range(1, 2001)}
+    names[('venues', 5000)] = 'Venue Zebra'
+    index = SuggestIndex()
+    index.replace(names)
+    assert [result['id'] for result in index.suggest('venue zeb', 'venues')] == [5000]
+
+
+def test_add_rename_and_remove(index):
+    index.add('venues', 4, 'Blue Room')
+    assert names(index.suggest('blu', 'venues')) == ['Blue Room']
+
+    index.add('venues', 4, 'Red Room')
+    assert index.suggest('blu', 'venues') == []
+    assert names(index.suggest('red', 'venues')) == ['Red Room']
+
+    index.remove('venues', 4)
+    assert index.suggest('room', 'venues') == []
+
+
+def test_writes_before_the_first_load_are_ignored():
+    index = SuggestIndex()
+    index.add('venues', 1, 'Blue Room')
+    assert index._names == {}
+
+
+def test_stale_after_ttl(index):
+    assert not index._stale()
+    index._loaded_at = time.time() - index.ttl - 1
+    assert index._stale()
+
+
+def test_stale_when_tags_move(index):
+    index.replace(dict(NAMES), cache.backend.tag_versions(('venues', 'artists')))
+    index._loaded_at = time.time() - index.interval - 1
+    assert not index._stale()
+
+    cache.invalidate(('venues',))
+    assert index._stale()
+
+    # but not more often than every `interval` seconds
+    index._loaded_at = time.time()
+    assert not index._stale()
@@ -0,0 +1,27 @@
+from sqlalchemy import text
+
+from models import db
+
+
+def areas():
+    return db.session.execute(text(
+        'SELECT state, city, venue_ids FROM venue_areas ORDER BY state, city'
+    )).all()
+
+
+def test_venues_without_a_city_or_state_keep_an_area(app):
+    db.session.execute(text("""
+        INSERT INTO venues (name, city, state) VALUES ('The Musical Hop', 'San Francisco', 'CA'),
+          ('The Dueling Pianos Bar', NULL, 'NY'), ('Park Square Live Music & Coffee', NULL, NULL);
+    """))
+    db.session.commit()
+    assert areas() == [('', '', [3]), ('CA', 'San Francisco', [1]), ('NY', '', [2])]
+
+    page = app.test_client().get('/venues').get_data(as_text=True)
+    assert 'The Dueling Pianos Bar' in page and 'Park Square Live Music &amp; Coffee' in page
+    assert 'Unknown city, NY' in page
+
+    db.session.execute(text("UPDATE venues SET city = 'New York' WHERE id = 2"))
+    db.session.execute(text('DELETE FROM venues WHERE id = 3'))
+    db.session.commit()
+    assert areas() == [('CA', 'San Francisco', [1]), ('NY', 'New York', [2])]